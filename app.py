@@ -1,22 +1,43 @@
 # Import data from shared.py
+from src import shared
 from src.shared import (
     app_dir,
-    match_history,
+    raw_data_path,
     tracked_players,
-    participation_dictionary,
     variables_dictionary_all,
     numeric_variables,
+    profiler,
 )
 
 # Import plotting functions
-from src.plots import boxplot_stat, scatterplot_interactive, winrate_plot
+from src.plots import (
+    boxplot_stat,
+    correlation_heatmap,
+    figure_traces,
+    form_lineplot,
+    highlight_points,
+    hover_index,
+    pair_heatmap,
+    patch_figure,
+    plot_modules,
+    scatterplot_interactive,
+    winrate_plot,
+)
+from src.events import debounce, throttle
+from src.trend import strongest_pairs
 
 # Import shiny
-from shiny import reactive
+from shiny import reactive, req
+from shiny.types import SilentException
 from shiny.express import input, render, ui
 from shinywidgets import render_widget
-import numpy as np
-import plotly.express as px
+import plotly.graph_objects as go
+
+# Many tracked players: include and exclude them with multi-selects
+large_roster = len(tracked_players) > shared.large_roster_players
+
+# Load the history in the background, the page is served in the meantime
+shared.start_loading(raw_data_path, warm_modules=plot_modules)
 
 ui.page_opts(title="SamuTracker", fillable=True)
 
@@ -25,6 +46,17 @@ with ui.sidebar(title="Filter games"):
 
     @render.ui
     def dynamic_player_inputs():
+        if large_roster:
+            # Searchable, only the picked players are sent back
+            return [
+                ui.input_selectize(
+                    id=f"{selection}_players",
+                    label=label,
+                    choices=dict(zip(shared.tracked_ids, shared.tracked_names)),
+                    multiple=True,
+                )
+                for selection, label in [("include", "Include"), ("exclude", "Exclude")]
+            ]
         inputs_player = []
         for i in tracked_players.items():
             inputs_player.append(
@@ -41,6 +73,21 @@ with ui.sidebar(title="Filter games"):
             )
         return inputs_player
 
+    ui.input_numeric(
+        id="min_included",
+        label="Minimum included players (0 = all)",
+        value=0,
+        min=0,
+        step=1,
+    )
+
+    ui.input_radio_buttons(
+        id="included_teams",
+        label="Included players teams",
+        choices={"any": "Any", "same": "Same team", "opposing": "Opposing teams"},
+        selected="any",
+    )
+
     ui.input_slider(
         id="n_games", label="Number of games to use", min=1, max=100, value=100, step=1
     )
@@ -73,14 +120,39 @@ with ui.sidebar(title="Filter games"):
         selected=variables_dictionary_all["core_goals"],
     )
 
+    # Developer panel, only there when profiling (SAMUTRACKER_PROFILE=1)
+    if profiler.enabled:
+        with ui.accordion(open=False):
+            with ui.accordion_panel("Performance"):
+
+                @render.data_frame
+                def performance_summary():
+                    reactive.invalidate_later(2)
+                    return profiler.summary().round(1)
+
+                @render.data_frame
+                def performance_histograms():
+                    reactive.invalidate_later(2)
+                    return profiler.histograms().rename_axis("Function").reset_index()
+
+                @render.data_frame
+                def performance_memory():
+                    # Memory of the history with the default and compact dtypes
+                    history_version()
+                    return shared.memory_report(
+                        shared.history_snapshot["match_history"]
+                    ).round(2)
+
 
 with ui.layout_columns():
     with ui.card(full_screen=True):
         ui.card_header("X variable plot")
 
         @render_widget
+        @profiler.profile
         def xvar_plot():
-            plot = boxplot_stat(df=filtered_mh(), stat=input.x_var())
+            plot = figure_widget("xvar_plot")
+            hover_indices["xvar_plot"] = hover_index(plot)
             for layer in plot.data:
                 layer.on_hover(on_point_hover)
             return plot
@@ -89,8 +161,10 @@ with ui.layout_columns():
         ui.card_header("Y variable plot")
 
         @render_widget
+        @profiler.profile
         def yvar_plot():
-            plot = boxplot_stat(df=filtered_mh(), stat=input.y_var())
+            plot = figure_widget("yvar_plot")
+            hover_indices["yvar_plot"] = hover_index(plot)
             for layer in plot.data:
                 layer.on_hover(on_point_hover)
             return plot
@@ -99,8 +173,9 @@ with ui.layout_columns():
         ui.card_header("Winrates")
 
         @render_widget
+        @profiler.profile
         def wr_plot():
-            plot = winrate_plot(df=filtered_mh())
+            plot = figure_widget("wr_plot")
             for layer in plot.data:
                 layer.on_hover(on_point_unhover)
             return plot
@@ -111,16 +186,10 @@ with ui.layout_columns():
         ui.card_header(f"Custom correlation")
 
         @render_widget
+        @profiler.profile
         def interactive_plot():
-            trend_type = "ols" if input.trendline_display() else None
-            trend_scope = "trace" if input.trendline_scope() else "overall"
-            plot = scatterplot_interactive(
-                df=filtered_mh(),
-                x=input.x_var(),
-                y=input.y_var(),
-                trend=trend_type,
-                scope=trend_scope,
-            )
+            plot = figure_widget("interactive_plot")
+            hover_indices["interactive_plot"] = hover_index(plot)
             for layer in plot.data:
                 layer.on_hover(on_point_hover)
             return plot
@@ -128,147 +197,313 @@ with ui.layout_columns():
     with ui.card(full_screen=True):
 
         @render.data_frame
+        @profiler.profile
         def summary_table():
-            df = filtered_mh()
-            df_grouped = (
-                df.groupby(variables_dictionary_all["id"])
-                .agg(
-                    Games=(variables_dictionary_all["timestamp"], "size"),
-                    Goals=(variables_dictionary_all["core_goals"], "sum"),
-                    Assists=(variables_dictionary_all["core_assists"], "sum"),
-                    Saves=(variables_dictionary_all["core_saves"], "sum"),
-                    Shots=(variables_dictionary_all["core_shots"], "sum"),
-                    Demolishes=(variables_dictionary_all["demo_inflicted"], "sum"),
-                )
-                .reset_index()[
-                    [
-                        variables_dictionary_all["id"],
-                        "Games",
-                        "Goals",
-                        "Assists",
-                        "Saves",
-                        "Shots",
-                        "Demolishes",
-                    ]
-                ]
-            )
-            df_grouped[variables_dictionary_all["id"]] = df_grouped[
-                variables_dictionary_all["id"]
-            ].replace(tracked_players)
-            df_grouped = df_grouped.rename(
-                columns={variables_dictionary_all["id"]: "Player"}
-            )
-            return df_grouped
+            df = summary()[["FixedName", "Games", *shared.summary_stats]]
+            return df.rename(columns={"FixedName": "Player"})
 
         @render.ui
+        @profiler.profile
         def hovered_game():
-            hovered_timestamp = hover_reactive.get()
-            game_out = match_history[
-                (
-                    match_history[variables_dictionary_all["timestamp"]].isin(
-                        [hovered_timestamp]
-                    )
-                )
-            ]
-            game_out = game_out[
-                [
-                    variables_dictionary_all["team"],
-                    variables_dictionary_all["player"],
-                    variables_dictionary_all["core_score"],
-                    variables_dictionary_all["core_goals"],
-                    variables_dictionary_all["core_saves"],
-                    variables_dictionary_all["core_shots"],
-                    variables_dictionary_all["demo_inflicted"],
-                ]
-            ]
-            styled = (
-                game_out.style.apply(highlight_scores, axis=1)
-                .hide(subset=[variables_dictionary_all["team"]], axis="columns")
-                .hide(axis="index")
-                .set_table_styles(
-                    [
-                        {"selector": "", "props": [("border", "2px solid grey")]},
-                        {
-                            "selector": "tbody td",
-                            "props": [("border", "1px solid grey")],
-                        },
-                        {
-                            "selector": "th",
-                            "props": [
-                                ("border", "1px solid grey"),
-                                ("text-align", "left"),
-                                ("padding-left", "4px"),
-                                ("font-size", "12px"),
-                            ],
-                        },
-                    ]
-                )
-                .set_properties(
-                    **{"text-align": "left", "padding-left": "4px", "font-size": "12px"}
-                )
+            history_version()
+            return ui.HTML(shared.scoreboard(hovered_timestamp()))
+
+
+with ui.layout_columns():
+    with ui.card(full_screen=True):
+        ui.card_header("Correlation explorer")
+        ui.input_radio_buttons(
+            id="corr_method",
+            label=None,
+            choices={"pearson": "Pearson", "spearman": "Spearman"},
+            selected="pearson",
+            inline=True,
+        )
+
+        @render_widget
+        @profiler.profile
+        def correlation_plot():
+            plot = figure_widget("correlation_plot")
+            for layer in plot.data:
+                layer.on_click(on_pair_click)
+            return plot
+
+    with ui.card(full_screen=True):
+        ui.card_header("Strongest correlations")
+
+        @render.data_frame
+        @profiler.profile
+        def correlation_pairs():
+            return render.DataGrid(
+                strongest_correlations().round(2), selection_mode="row"
             )
-            return ui.HTML(styled.to_html())
+
+
+with ui.layout_columns():
+    with ui.card(full_screen=True):
+        ui.card_header("Form")
+        ui.input_select(
+            id="form_var",
+            label=None,
+            choices=numeric_variables,
+            selected=variables_dictionary_all["core_score"],
+        )
+
+        @render_widget
+        @profiler.profile
+        def form_plot():
+            return figure_widget("form_plot")
+
+    with ui.card(full_screen=True):
+        ui.card_header("Pairs of players")
+        ui.input_radio_buttons(
+            id="pair_relation",
+            label=None,
+            choices={"together": "Same team", "against": "Opposing teams"},
+            selected="together",
+            inline=True,
+        )
+
+        @render_widget
+        @profiler.profile
+        def pair_plot():
+            return figure_widget("pair_plot")
 
 
 ui.include_css(app_dir / "styles.css")
 
 
+history_ready = reactive.value(False)
+
+
+@reactive.effect
+def _():
+    # Checked every 0.5 s until the history is loaded, then never again
+    if shared.history_loaded.is_set():
+        history_ready.set(True)
+    else:
+        reactive.invalidate_later(0.5)
+
+
+@reactive.calc
+def history_loaded():
+    return history_ready.get()
+
+
+@reactive.effect
+def _():
+    if history_loaded():
+        ui.notification_remove("loading_history")
+    else:
+        ui.notification_show(
+            "Loading match history...",
+            id="loading_history",
+            duration=None,
+            close_button=False,
+        )
+
+
+@reactive.poll(
+    lambda: shared.history_stamp(raw_data_path),
+    interval_secs=shared.history_poll_secs,
+)
+@profiler.profile
+def history_version():
+    # Append the games added to the shards (or reload the store published by the
+    # loader), open sessions update in place
+    req(history_loaded())
+    if shared.load_error is not None:
+        raise shared.load_error
+    return shared.refresh_history(raw_data_path)
+
+
+@debounce(shared.slider_debounce_secs)
+def n_games():
+    # Dragging the slider recomputes the views and figures once, when it stops
+    return input.n_games()
+
+
 @reactive.calc
-def filter_mh_game_player():
-
-    # Select players of interest
-    filt_mh = match_history[
-        (match_history[variables_dictionary_all["id"]].isin(tracked_players.keys()))
-    ]
-
-    # Add Fixed name
-    filt_mh["FixedName"] = filt_mh[variables_dictionary_all["id"]].map(tracked_players)
-
-    # First, filter by game mode
-    filt_mh = filt_mh[filt_mh[variables_dictionary_all["gamemode"]] == input.mode()]
-
-    # Filter games by selected players
-    players_selection = selected_players_dict()
-    must_include_players = [k for k, v in players_selection.items() if v == "in"]
-    must_exclude_players = [k for k, v in players_selection.items() if v == "out"]
-
-    # Remove games with excluded players
-    games_without_excluded = [
-        k
-        for k, v in participation_dictionary.items()
-        if all(x not in v for x in must_exclude_players)
-    ]
-    games_with_included = [
-        k
-        for k, v in participation_dictionary.items()
-        if all(x in v for x in must_include_players)
-    ]
-    games_selected = list(set(games_without_excluded) & set(games_with_included))
-    filt_mh = filt_mh[
-        filt_mh[variables_dictionary_all["timestamp"]].isin(games_selected)
-    ]
-    # Keep only entries of players of interest
-    filt_mh = filt_mh[
-        filt_mh[variables_dictionary_all["id"]].isin(tracked_players.keys())
-    ]
-    return filt_mh
+def players_filter():
+    if large_roster:
+        # Sorted, the same selection picked in another order shares its views
+        include = sorted(input.include_players())
+        exclude = sorted(input.exclude_players())
+    else:
+        players_selection = selected_players_dict()
+        include = [k for k, v in players_selection.items() if v == "in"]
+        exclude = [k for k, v in players_selection.items() if v == "out"]
+    return dict(
+        mode=input.mode(),
+        include=include,
+        exclude=exclude,
+        min_included=input.min_included(),
+        teams=input.included_teams(),
+    )
+
+
+@reactive.calc
+@profiler.profile
+def filtered_games():
+    # Views are shared by all sessions through shared.view_cache
+    history_version()
+    return shared.filter_games(**players_filter())
 
 
 @reactive.calc
+@profiler.profile
 def filtered_mh():
-    mh = filter_mh_game_player()
-    unique_games = list(set(mh[variables_dictionary_all["timestamp"]]))
-    games_selected = sorted(unique_games, reverse=True)[0 : input.n_games()]
-    mh = mh[mh[variables_dictionary_all["timestamp"]].isin(games_selected)]
-    return mh
+    history_version()
+    return shared.last_games(n_games(), **players_filter())
+
+
+@reactive.calc
+@profiler.profile
+def summary():
+    history_version()
+    return shared.summary_totals(n_games(), **players_filter())
+
+
+@reactive.calc
+@profiler.profile
+def correlations():
+    history_version()
+    return shared.correlations(input.corr_method(), n_games(), **players_filter())
+
+
+@reactive.calc
+@profiler.profile
+def form_view():
+    history_version()
+    return shared.form_view(input.form_var(), n_games(), **players_filter())
+
+
+@reactive.calc
+@profiler.profile
+def pair_winrates():
+    history_version()
+    return shared.pair_winrates(input.pair_relation(), n_games(), **players_filter())
+
+
+@reactive.calc
+@profiler.profile
+def strongest_correlations():
+    return strongest_pairs(correlations())
+
+
+@reactive.calc
+@profiler.profile
+def xvar_figure():
+    return boxplot_stat(df=filtered_mh(), stat=input.x_var())
+
+
+@reactive.calc
+@profiler.profile
+def yvar_figure():
+    return boxplot_stat(df=filtered_mh(), stat=input.y_var())
+
+
+@reactive.calc
+@profiler.profile
+def wr_figure():
+    return winrate_plot(df=summary())
+
+
+@reactive.calc
+@profiler.profile
+def interactive_figure():
+    trend_type = "ols" if input.trendline_display() else None
+    trend_scope = "trace" if input.trendline_scope() else "overall"
+    return scatterplot_interactive(
+        df=filtered_mh(),
+        x=input.x_var(),
+        y=input.y_var(),
+        trend=trend_type,
+        scope=trend_scope,
+    )
+
+
+@reactive.calc
+@profiler.profile
+def correlation_figure():
+    return correlation_heatmap(correlations())
+
+
+@reactive.calc
+@profiler.profile
+def form_figure():
+    return form_lineplot(df=form_view(), stat=input.form_var())
+
+
+@reactive.calc
+@profiler.profile
+def pair_figure():
+    return pair_heatmap(df=pair_winrates(), relation=input.pair_relation())
+
+
+# Widgets are kept alive and patched with their new figure, they are rebuilt
+# (and their callbacks registered again) only when the traces change
+figures = {
+    "xvar_plot": xvar_figure,
+    "yvar_plot": yvar_figure,
+    "wr_plot": wr_figure,
+    "interactive_plot": interactive_figure,
+    "correlation_plot": correlation_figure,
+    "form_plot": form_figure,
+    "pair_plot": pair_figure,
+}
+widget_builds = {name: reactive.value(0) for name in figures}
+# Traces of each widget when it was built
+widget_traces = {}
+
+
+def figure_widget(name):
+    widget_builds[name]()
+    with reactive.isolate():
+        fig = figures[name]()
+    widget_traces[name] = figure_traces(fig)
+    return profiler.call(f"{name} widget", go.FigureWidget, fig)
+
+
+def patch_widget(name, output):
+    @reactive.effect
+    def _():
+        try:
+            fig = figures[name]()
+            with reactive.isolate():
+                if widget_traces.get(name) == figure_traces(fig):
+                    profiler.call(f"{name} patch", patch_figure, output.widget, fig)
+                    if name in hover_indices:
+                        hover_indices[name] = hover_index(fig)
+                    return
+        except SilentException:
+            raise
+        except Exception:
+            # Rebuilt to show the error in the output, not to end the session,
+            # and rebuilt again with the next figure
+            widget_traces.pop(name, None)
+        with reactive.isolate():
+            widget_builds[name].set(widget_builds[name]() + 1)
+
+
+patch_widget("xvar_plot", xvar_plot)
+patch_widget("yvar_plot", yvar_plot)
+patch_widget("wr_plot", wr_plot)
+patch_widget("interactive_plot", interactive_plot)
+patch_widget("correlation_plot", correlation_plot)
+patch_widget("form_plot", form_plot)
+patch_widget("pair_plot", pair_plot)
 
 
 @reactive.effect
 def _():
-    max_n_games = len(
-        list(set(filter_mh_game_player()[variables_dictionary_all["timestamp"]]))
-    )
-    ui.update_slider(id="n_games", max=max_n_games)
+    ui.update_slider(id="n_games", max=len(filtered_games()))
+
+
+@reactive.effect
+def _():
+    # Scoreboards of the most recent games, rendered before they are hovered
+    shared.prerender_scoreboards(filtered_games())
 
 
 @reactive.calc
@@ -279,75 +514,77 @@ def selected_players_dict():
     return out_dict
 
 
-hover_reactive = reactive.value()
+# Time stamp of the last hovered game, None when unhovered
+hover_request = reactive.value()
+
+# Points of each figure indexed by game time stamp, set when the figure is built
+hover_indices = {}
 
 
+@profiler.profile
 def on_point_hover(trace, points, state):
-    if points.point_inds:
-        idx = points.point_inds[0]
-        hover_reactive.set(trace["customdata"][points.point_inds][0][3])
-        with xvar_plot.widget.batch_update():
-            n_boxes = len(xvar_plot.widget.data) - 1
-            custom_data = [x["customdata"] for x in xvar_plot.widget.data[0:n_boxes]]
-            hovered_match = np.vstack(
-                [x[x[:, 3] == hover_reactive.get()] for x in custom_data]
-            )
-            xvar_plot.widget.data[n_boxes].x = hovered_match[:, 0]
-            xvar_plot.widget.data[n_boxes].y = hovered_match[:, 2]
-
-        with yvar_plot.widget.batch_update():
-            n_boxes = len(yvar_plot.widget.data) - 1
-            custom_data = [x["customdata"] for x in yvar_plot.widget.data[0:n_boxes]]
-            hovered_match = np.vstack(
-                [x[x[:, 3] == hover_reactive.get()] for x in custom_data]
-            )
-            yvar_plot.widget.data[n_boxes].x = hovered_match[:, 0]
-            yvar_plot.widget.data[n_boxes].y = hovered_match[:, 2]
-
-        with interactive_plot.widget.batch_update():
-            mh = filtered_mh()
-            mh = mh[mh[variables_dictionary_all["timestamp"]] == hover_reactive.get()]
-            n_boxes = len(interactive_plot.widget.data) - 1
-            player_data = [
-                x
-                for x in interactive_plot.widget.data
-                if x["legendgroup"] in mh["FixedName"].tolist()
-            ]
-            color_map = dict(
-                zip(
-                    [x["legendgroup"] for x in player_data],
-                    [x["marker"]["color"] for x in player_data],
-                )
-            )
-            interactive_plot.widget.data[n_boxes].x = mh[input.x_var()]
-            interactive_plot.widget.data[n_boxes].y = mh[input.y_var()]
-            interactive_plot.widget.data[n_boxes].marker = dict(
-                size=14, color=mh["FixedName"].map(color_map), symbol="star"
-            )
+    # Trendlines and boxes of large figures have no game
+    if points.point_inds and trace.customdata is not None:
+        request_hover(trace["customdata"][points.point_inds][0][3])
 
 
+@profiler.profile
 def on_point_unhover(trace, points, state):
-    hover_reactive.set(None)
-    with xvar_plot.widget.batch_update():
-        n_boxes = len(xvar_plot.widget.data) - 1
-        xvar_plot.widget.data[n_boxes].x = []
-        xvar_plot.widget.data[n_boxes].y = []
-
-    with yvar_plot.widget.batch_update():
-        n_boxes = len(yvar_plot.widget.data) - 1
-        yvar_plot.widget.data[n_boxes].x = []
-        yvar_plot.widget.data[n_boxes].y = []
-
-    with interactive_plot.widget.batch_update():
-        n_boxes = len(interactive_plot.widget.data) - 1
-        interactive_plot.widget.data[n_boxes].x = []
-        interactive_plot.widget.data[n_boxes].y = []
-
-
-def highlight_scores(val):
-    team_color = list(val)[0]
-    if team_color == "blue":
-        return ["background-color: lightskyblue"] * len(val)
-    elif team_color == "orange":
-        return ["background-color: lightsalmon"] * len(val)
-    return [""] * len(val)
+    request_hover(None)
+
+
+def request_hover(timestamp):
+    # Points of the game already hovered do not invalidate anything
+    with reactive.isolate():
+        if hover_request.is_set() and hover_request.get() == timestamp:
+            return
+    hover_request.set(timestamp)
+
+
+@throttle(shared.hover_throttle_secs)
+def hovered_timestamp():
+    # Hovers faster than the throttle only show the last game
+    return hover_request.get()
+
+
+@reactive.effect
+def _():
+    highlight_game(hovered_timestamp())
+
+
+def highlight_game(timestamp):
+    plots = {
+        "xvar_plot": xvar_plot,
+        "yvar_plot": yvar_plot,
+        "interactive_plot": interactive_plot,
+    }
+    for name, plot in plots.items():
+        if plot.widget is None:
+            continue
+        game_points = hover_indices.get(name, {}).get(timestamp)
+        highlight_points(plot.widget, game_points, star=name == "interactive_plot")
+
+
+# Pair of variables picked in the correlation explorer, shown in interactive_plot
+picked_pair = reactive.value()
+
+
+@profiler.profile
+def on_pair_click(trace, points, state):
+    if points.xs:
+        picked_pair.set((points.xs[0], points.ys[0]))
+
+
+@reactive.effect
+def _():
+    rows = correlation_pairs.cell_selection()["rows"]
+    if rows:
+        pair = strongest_correlations().iloc[rows[0]]
+        picked_pair.set((pair["X"], pair["Y"]))
+
+
+@reactive.effect
+def _():
+    x_var, y_var = picked_pair.get()
+    ui.update_select(id="x_var", selected=x_var)
+    ui.update_select(id="y_var", selected=y_var)
@@ -0,0 +1,188 @@
+"""
+Time the data and plotting hot paths of the app on synthetic histories: loading,
+filters, figures and the hover of a game
+
+Each run is appended to benchmarks/results/hot_paths.csv with the commit it was
+run on, and compared with the previous run of each step.
+
+Run from the repository root: python -m benchmarks.bench_hot_paths
+"""
+
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+import plotly.graph_objects as go
+import yaml
+from benchmarks.synthetic import synthetic_history
+from src import shared
+from src.plots import (
+    boxplot_stat,
+    highlight_points,
+    hover_index,
+    scatterplot_interactive,
+    winrate_plot,
+)
+from src.scoreboard import game_scoreboard
+from src.variables import variables_dictionary_all
+
+game_counts = [1000, 10000, 100000]
+repeats = 3
+results_file = Path("benchmarks/results/hot_paths.csv")
+# Default filters of the app, over all the games
+filters = dict(mode="3v3")
+x = variables_dictionary_all["core_score"]
+y = variables_dictionary_all["core_goals"]
+
+
+def best_time(function, *args, setup=None, **kwargs):
+    """
+    Best wall time of a function over a few runs, and its last output
+
+    :param function: Function to time
+    :param setup: Optional function called before each run, not timed
+    """
+    timings = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        output = function(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings), output
+
+
+def hover_game(widget, index, timestamp):
+    """
+    Work done when a game is hovered: highlight its points and render its
+    scoreboard
+
+    :param widget: FigureWidget of the hovered figure
+    :param index: Points of the figure from hover_index
+    :param timestamp: Time stamp of the hovered game
+    """
+    highlight_points(widget, index.get(timestamp), star=True)
+    ranked = {
+        k: variables_dictionary_all[v] for k, v in shared.percentile_stats.items()
+    }
+    snapshot = shared.history_snapshot
+    return game_scoreboard(
+        snapshot["match_history"],
+        snapshot["games"],
+        timestamp,
+        snapshot["percentiles"],
+        ranked,
+    )
+
+
+def time_steps(data_path, n_games):
+    """
+    Best time of each step on the history of data_path, in seconds
+
+    :param data_path: Folder with the shards
+    :param n_games: Number of games of the history
+    """
+
+    def remove_stores():
+        shutil.rmtree(data_path / "store", ignore_errors=True)
+        shutil.rmtree(data_path / "shards", ignore_errors=True)
+
+    timings = {}
+    timings["read_history (cold)"], _ = best_time(
+        shared.read_history, data_path, setup=remove_stores
+    )
+    timings["read_history (warm)"], match_history = best_time(
+        shared.read_history, data_path
+    )
+    timings["participation_dict"], _ = best_time(
+        shared.participation_dict, match_history
+    )
+
+    shared.load_history(data_path)
+    if shared.load_error is not None:
+        raise shared.load_error
+    # Filters are cached in the view cache, they are timed uncached
+    clear = shared.view_cache.clear
+    timings["filter_games"], _ = best_time(shared.filter_games, **filters, setup=clear)
+    timings["filter_history"], _ = best_time(
+        shared.filter_history, **filters, setup=clear
+    )
+    timings["last_games"], df = best_time(
+        shared.last_games, n_games, **filters, setup=clear
+    )
+    timings["summary_totals"], summary = best_time(
+        shared.summary_totals, n_games, **filters, setup=clear
+    )
+
+    timings["boxplot_stat"], _ = best_time(boxplot_stat, df, x)
+    timings["scatterplot_interactive"], fig = best_time(
+        scatterplot_interactive, df, x, y, "ols", "overall"
+    )
+    timings["winrate_plot"], _ = best_time(winrate_plot, summary)
+
+    timings["hover_index"], index = best_time(hover_index, fig)
+    widget = go.FigureWidget(fig)
+    timestamp = df[variables_dictionary_all["timestamp"]].iloc[-1]
+    timings["hover"], _ = best_time(hover_game, widget, index, timestamp)
+    return timings
+
+
+def current_commit():
+    """
+    Short hash of the checked out commit, None outside of a git repository
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    with open("tracked_players.yml", "r") as f:
+        tracked_players = yaml.safe_load(f)
+    previous = (
+        pd.read_csv(results_file).groupby(["games", "step"])["seconds"].last().to_dict()
+        if results_file.exists()
+        else {}
+    )
+
+    run = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": current_commit(),
+    }
+    results = []
+    print(f"{'games':>8} {'step':<24} {'time (s)':>9} {'previous':>9} {'x':>6}")
+    for n_games in game_counts:
+        data_path = Path(tempfile.mkdtemp())
+        try:
+            synthetic_history(n_games, players=tracked_players).to_pickle(
+                data_path / "main.pkl"
+            )
+            timings = time_steps(data_path, n_games)
+        finally:
+            shutil.rmtree(data_path)
+
+        for step, seconds in timings.items():
+            results.append({**run, "games": n_games, "step": step, "seconds": seconds})
+            before = previous.get((n_games, step))
+            change = f"{seconds / before:>6.2f}" if before else ""
+            before = f"{before:>9.4f}" if before else ""
+            print(f"{n_games:>8} {step:<24} {seconds:>9.4f} {before:>9} {change:>6}")
+
+    results_file.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(results).to_csv(
+        results_file, mode="a", header=not results_file.exists(), index=False
+    )
+    print(f"Results appended to {results_file}")
+
+
+if __name__ == "__main__":
+    main()
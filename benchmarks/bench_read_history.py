@@ -0,0 +1,98 @@
+"""
+Compare the derivation of the match history (date/time, game mode, result,
+deduplication) before and after vectorization, on synthetic histories
+
+Run from the repository root: python -m benchmarks.bench_read_history
+"""
+
+import time
+import numpy as np
+import pandas as pd
+import yaml
+from benchmarks.synthetic import synthetic_history
+from src.shared import derive_history
+
+game_counts = [1000, 10000, 50000]
+repeats = 3
+
+
+def legacy_derive_history(match_history):
+    """
+    Derivation as it was done by read_history before vectorization
+
+    :param match_history: Raw rows from SamuParser
+    """
+    match_history[["date", "time"]] = match_history["timestamp"].str.split(
+        "T", expand=True
+    )
+    match_history = match_history.drop_duplicates()
+    game_mode = match_history["timestamp"].value_counts().reset_index()
+    game_mode.columns = ["timestamp", "n_players"]
+    game_mode["gamemode"] = game_mode["n_players"].apply(
+        lambda x: f"{int(x/2)}v{int(x/2)}"
+    )
+    game_mode = game_mode.drop(columns=["n_players"])
+    match_history = pd.merge(match_history, game_mode, on="timestamp", how="left")
+    win_df = (
+        match_history.pivot_table(
+            index="timestamp", columns="team", values="core_goals", aggfunc="sum"
+        )
+        .reset_index()
+        .rename_axis(None, axis=1)
+    )
+    win_df["winner"] = np.where(
+        win_df["blue"] > win_df["orange"],
+        "blue",
+        np.where(win_df["orange"] > win_df["blue"], "orange", "draw"),
+    )
+    win_df = win_df[["timestamp", "winner"]]
+    match_history = pd.merge(match_history, win_df, on="timestamp", how="left")
+    match_history["gamewin"] = np.where(
+        match_history["winner"] == match_history["team"], "win", "loss"
+    )
+    return match_history.drop(columns=["winner"])
+
+
+def best_time(function, raw_history):
+    """
+    Best wall time of a derivation over a few runs, and its last output
+
+    :param function: Derivation function
+    :param raw_history: Raw rows from SamuParser, copied before each run
+    """
+    timings = []
+    for _ in range(repeats):
+        raw = raw_history.copy()
+        start = time.perf_counter()
+        derived = function(raw)
+        timings.append(time.perf_counter() - start)
+    return min(timings), derived
+
+
+def main():
+    with open("tracked_players.yml", "r") as f:
+        tracked_players = yaml.safe_load(f)
+
+    print(
+        f"{'games':>8} {'rows':>9} {'legacy (s)':>11} {'vectorized (s)':>15} {'x':>6}"
+    )
+    for n_games in game_counts:
+        raw_history = synthetic_history(
+            n_games, players=tracked_players, duplicates=0.01
+        )
+        legacy_time, legacy = best_time(legacy_derive_history, raw_history)
+        new_time, new = best_time(derive_history, raw_history)
+
+        key = ["timestamp", "id"]
+        pd.testing.assert_frame_equal(
+            legacy.sort_values(key).reset_index(drop=True),
+            new.sort_values(key).reset_index(drop=True),
+        )
+        print(
+            f"{n_games:>8} {len(raw_history):>9} {legacy_time:>11.3f} "
+            f"{new_time:>15.3f} {legacy_time / new_time:>6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
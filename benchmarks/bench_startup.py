@@ -0,0 +1,84 @@
+"""
+Measure the startup of the app: import time of its modules and loading time of
+the match history with a cold, warm and touched (same content, new mtime) store
+
+Run from the repository root: python -m benchmarks.bench_startup
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import yaml
+from benchmarks.synthetic import synthetic_history
+
+modules = [
+    "numpy",
+    "pandas",
+    "shiny",
+    "shinywidgets",
+    "plotly.graph_objects",
+    "plotly.express",
+    "src.shared",
+    "src.plots",
+]
+n_games = 20000
+
+
+def import_time(module):
+    """
+    Cumulative import time of a module in a fresh interpreter, in seconds
+
+    :param module: Module name
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Last line is the module itself: "import time: self | cumulative | name"
+    return int(result.stderr.strip().splitlines()[-1].split("|")[1]) / 1e6
+
+
+def load_time(data_path):
+    """
+    Time to load the history and build its indices, in seconds
+
+    :param data_path: Folder with main.pkl
+    """
+    from src import shared
+
+    start = time.perf_counter()
+    shared.load_history(data_path)
+    if shared.load_error is not None:
+        raise shared.load_error
+    return time.perf_counter() - start
+
+
+def main():
+    print("Import time (s)")
+    for module in modules:
+        print(f"  {module:<22} {import_time(module):>6.2f}")
+
+    with open("tracked_players.yml", "r") as f:
+        tracked_players = yaml.safe_load(f)
+    data_path = Path(tempfile.mkdtemp())
+    synthetic_history(n_games, players=tracked_players).to_pickle(
+        data_path / "main.pkl"
+    )
+
+    print(f"History load time (s), {n_games} games")
+    print(f"  {'cold (no store)':<22} {load_time(data_path):>6.2f}")
+    print(f"  {'warm (store)':<22} {load_time(data_path):>6.2f}")
+    os.utime(data_path / "main.pkl")
+    print(f"  {'touched (hash check)':<22} {load_time(data_path):>6.2f}")
+    print(f"  {'warm (store)':<22} {load_time(data_path):>6.2f}")
+    shutil.rmtree(data_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Synthetic match histories shaped like a main.pkl from SamuParser
+
+Write one for the app from the repository root:
+python -m benchmarks.synthetic <number of games> <data folder>
+"""
+
+import sys
+from pathlib import Path
+import yaml
+import numpy as np
+import pandas as pd
+from src.variables import variables_dictionary_all
+
+# Columns added by the app, they are not part of a SamuParser export
+derived_columns = ["FixedName", "date", "time", "gamewin", "gamemode"]
+string_columns = ["team", "player", "id", "timestamp"]
+
+
+def synthetic_history(
+    n_games,
+    n_players=50,
+    players=None,
+    modes=None,
+    duplicates=0.0,
+    seed=0,
+):
+    """
+    Generate a match history shaped like a main.pkl from SamuParser
+
+    :param n_games: Number of games
+    :param n_players: Number of random players in the pool
+    :param players: Optional dictionary of Account ID: name (like tracked_players)
+        added to the pool, these players show up in most games
+    :param modes: Dictionary of game mode: share of games, 1v1/2v2/3v3 by default
+    :param duplicates: Share of games exported twice, to exercise deduplication
+    :param seed: Seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    players = dict(players or {})
+    modes = modes or {"1v1": 0.1, "2v2": 0.3, "3v3": 0.6}
+
+    # Player pool, tracked players are drawn more often than random ones
+    ids = list(players) + [f"{i:032x}" for i in range(n_players)]
+    names = list(players.values()) + [f"Player {i}" for i in range(n_players)]
+    weights = np.r_[np.full(len(players), 20.0), np.ones(n_players)]
+
+    # Team size of each game and one row per player of each game
+    team_size = rng.choice(
+        [int(m.split("v")[0]) for m in modes],
+        size=n_games,
+        p=np.array(list(modes.values())) / sum(modes.values()),
+    )
+    game = np.repeat(np.arange(n_games), 2 * team_size)
+    position = np.arange(len(game)) - np.repeat(
+        np.cumsum(2 * team_size) - 2 * team_size, 2 * team_size
+    )
+
+    # Weighted draw without replacement of the players of each game
+    keys = np.log(weights) + rng.gumbel(size=(n_games, len(ids)))
+    lineups = np.argsort(-keys, axis=1)[:, : 2 * team_size.max()]
+    player = lineups[game, position]
+
+    seconds = np.sort(rng.choice(2 * 365 * 86400, size=n_games, replace=False))
+    timestamps = (
+        pd.Timestamp("2024-01-01") + pd.to_timedelta(seconds, unit="s")
+    ).strftime("%Y-%m-%dT%H:%M:%S")
+
+    match_history = pd.DataFrame(
+        {
+            "team": np.where(position < team_size[game], "blue", "orange"),
+            "player": np.array(names, dtype=object)[player],
+            "id": np.array(ids, dtype=object)[player],
+            "timestamp": np.asarray(timestamps, dtype=object)[game],
+        }
+    )
+
+    n_rows = len(match_history)
+    stats = {}
+    for column in variables_dictionary_all:
+        if column in derived_columns or column in string_columns:
+            continue
+        stats[column] = synthetic_stat(column, n_rows, rng)
+    stats["gamelength"] = np.repeat(rng.integers(300, 480, n_games), 2 * team_size)
+    stats["positioning_goals_against_while_last_defender"] = np.full(n_rows, np.nan)
+    match_history = pd.concat([match_history, pd.DataFrame(stats)], axis=1)
+
+    # Export some games twice
+    n_duplicates = int(duplicates * n_games)
+    if n_duplicates:
+        duplicated_games = rng.choice(n_games, size=n_duplicates, replace=False)
+        match_history = pd.concat(
+            [match_history, match_history[np.isin(game, duplicated_games)]],
+            ignore_index=True,
+        )
+    return match_history
+
+
+def synthetic_stat(column, n_rows, rng):
+    """
+    Random values in a plausible range for a SamuParser stat column
+
+    :param column: Raw column name
+    :param n_rows: Number of values
+    :param rng: Numpy random generator
+    """
+    if "percent" in column:
+        return rng.random(n_rows) * 100
+    if column == "core_score":
+        return rng.integers(0, 1000, n_rows)
+    if column == "core_mvp":
+        return rng.integers(0, 2, n_rows)
+    if column.startswith("core_") or column.startswith("demo_"):
+        return rng.poisson(1.5, n_rows)
+    if "_count_" in column:
+        return rng.poisson(20, n_rows)
+    if "_amount_" in column:
+        return rng.poisson(800, n_rows)
+    return rng.gamma(4.0, 40.0, n_rows)
+
+
+def main():
+    n_games, data_path = int(sys.argv[1]), Path(sys.argv[2])
+    with open("tracked_players.yml", "r") as f:
+        tracked_players = yaml.safe_load(f)
+    data_path.mkdir(parents=True, exist_ok=True)
+    synthetic_history(n_games, players=tracked_players).to_pickle(
+        data_path / "main.pkl"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+import sys
+import threading
+import numpy as np
+import pandas as pd
+
+
+class LRUCache:
+    """
+    Least recently used cache shared by all the sessions of the process
+
+    The cache is bounded by a number of entries and optionally by the total
+    size of its values in bytes, the least recently used entries are evicted
+    first.
+
+    :param max_entries: Maximum number of entries
+    :param max_bytes: Maximum total size of the values, unbounded if None
+    :param sizeof: Function returning the size of a value in bytes
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or value_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def get(self, key, compute):
+        """
+        Return the cached value of key, compute and store it on a miss
+
+        :param key: Hashable key of the value
+        :param compute: Function without argument computing the value
+        """
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+            self.misses += 1
+
+        # Computed outside the lock so that other keys are still served
+        value = compute()
+        size = self.sizeof(value)
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            self.evict()
+        return value
+
+    def evict(self):
+        """
+        Drop least recently used entries until the cache is within its bounds
+        """
+        with self.lock:
+            while self.entries and (
+                len(self.entries) > self.max_entries
+                or (self.max_bytes is not None and self.size > self.max_bytes)
+            ):
+                _, (_, size) = self.entries.popitem(last=False)
+                self.size -= size
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drop all entries, counters are kept
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Hit, miss and eviction counters with the current number of entries and size
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.size,
+            }
+
+
+def value_size(value):
+    """
+    Approximate size of a cached value in bytes
+
+    :param value: Cached value
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return sys.getsizeof(value)
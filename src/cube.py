@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+
+def build_cube(frame, keys, order):
+    """
+    Pre-aggregate rows into a cube of cumulative sums per group
+
+    Rows are sorted by group then by order, so the total of a group over any
+    range of order values is a difference of two cumulative sums. Missing
+    values are summed as 0.
+
+    :param frame: Data frame with the key columns, an integer order column and
+        numeric value columns
+    :param keys: Columns defining the groups
+    :param order: Integer column ordering the rows of each group (game rank)
+    """
+    frame = frame.sort_values([*keys, order], kind="stable")
+    group = frame.groupby(keys, sort=False).ngroup().to_numpy()
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    # Missing values count as 0, like in a pandas sum
+    values = np.nan_to_num(frame.drop(columns=[*keys, order]).to_numpy(dtype=float))
+    order_values = frame[order].to_numpy()
+    return {
+        "groups": frame[keys].iloc[starts].reset_index(drop=True),
+        "starts": starts,
+        "ends": np.r_[starts[1:], len(frame)],
+        "group": group,
+        "order": order_values,
+        # Group and order in one sorted key, to search all groups at once
+        "sort_key": group * (order_values.max(initial=0) + 1) + order_values,
+        "columns": list(frame.columns.drop([*keys, order])),
+        "values": values,
+        "cumsum": np.vstack([np.zeros((1, values.shape[1])), values.cumsum(axis=0)]),
+    }
+
+
+def cube_totals_since(cube, groups, since):
+    """
+    Totals of groups over their rows with an order of at least since
+
+    :param cube: Cube from build_cube
+    :param groups: Indices of the groups (rows of cube["groups"])
+    :param since: Smallest order value to include
+    """
+    groups = np.asarray(groups, dtype=int)
+    firsts = np.searchsorted(
+        cube["sort_key"], groups * (cube["order"].max(initial=0) + 1) + since
+    )
+    firsts = np.clip(firsts, cube["starts"][groups], cube["ends"][groups])
+    totals = cube["cumsum"][cube["ends"][groups]] - cube["cumsum"][firsts]
+    return pd.DataFrame(totals, columns=cube["columns"])
+
+
+def cube_totals_masked(cube, groups, row_mask):
+    """
+    Totals of groups over a subset of their rows
+
+    :param cube: Cube from build_cube
+    :param groups: Indices of the groups (rows of cube["groups"])
+    :param row_mask: Boolean mask over the rows of the cube
+    """
+    groups = np.asarray(groups, dtype=int)
+    masked = np.where(row_mask[:, None], cube["values"], 0)
+    masked_cumsum = np.vstack([np.zeros((1, masked.shape[1])), masked.cumsum(axis=0)])
+    totals = masked_cumsum[cube["ends"][groups]] - masked_cumsum[cube["starts"][groups]]
+    return pd.DataFrame(totals, columns=cube["columns"])
@@ -0,0 +1,109 @@
+import time
+from shiny import reactive
+
+
+def debounce(delay_secs):
+    """
+    Decorator turning a reactive function into a calc that only changes once
+    its value has not changed for delay_secs
+
+    Intermediate values are dropped, the calc returns the latest value (latest
+    wins), so a burst of events (a dragged slider) computes its dependents once.
+
+    :param delay_secs: Quiet time before the latest value is passed on
+    """
+
+    def wrapper(function):
+        latest = reactive.calc(function)
+        deadline = reactive.value(None)
+        trigger = reactive.value(0)
+        first_run = True
+
+        @reactive.effect(priority=102)
+        def _():
+            nonlocal first_run
+            try:
+                latest()
+            except Exception:
+                pass  # Raised again by the debounced calc
+            # The first value is passed on at once
+            if not first_run:
+                deadline.set(time.monotonic() + delay_secs)
+            first_run = False
+
+        @reactive.effect(priority=101)
+        def _():
+            if deadline() is None:
+                return
+            wait = deadline() - time.monotonic()
+            if wait > 0:
+                reactive.invalidate_later(wait)
+                return
+            with reactive.isolate():
+                deadline.set(None)
+                trigger.set(trigger() + 1)
+
+        @reactive.calc
+        @reactive.event(trigger, ignore_none=False)
+        def debounced():
+            return latest()
+
+        return debounced
+
+    return wrapper
+
+
+def throttle(interval_secs):
+    """
+    Decorator turning a reactive function into a calc that changes at most
+    once every interval_secs
+
+    A change after a quiet interval is passed on at once, the changes made
+    during an interval are coalesced into their latest value, passed on at its
+    end (latest wins). Fast mouse movements then update the page at a bounded
+    rate and always end on the last hovered point.
+
+    :param interval_secs: Minimum time between two changes of the calc
+    """
+
+    def wrapper(function):
+        latest = reactive.calc(function)
+        pending = reactive.value(False)
+        trigger = reactive.value(0)
+        first_run = True
+        last_change = float("-inf")
+
+        @reactive.effect(priority=102)
+        def _():
+            nonlocal first_run
+            try:
+                latest()
+            except Exception:
+                pass  # Raised again by the throttled calc
+            # The first value is passed on at once
+            if not first_run:
+                pending.set(True)
+            first_run = False
+
+        @reactive.effect(priority=101)
+        def _():
+            nonlocal last_change
+            if not pending():
+                return
+            wait = last_change + interval_secs - time.monotonic()
+            if wait > 0:
+                reactive.invalidate_later(wait)
+                return
+            last_change = time.monotonic()
+            with reactive.isolate():
+                pending.set(False)
+                trigger.set(trigger() + 1)
+
+        @reactive.calc
+        @reactive.event(trigger, ignore_none=False)
+        def throttled():
+            return latest()
+
+        return throttled
+
+    return wrapper
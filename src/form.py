@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+
+# Rows of a group computed at once, to bound the memory of the intermediate
+# arrays (rows times columns)
+chunk_rows = 10000
+
+
+def empty_form(keys, columns, window, halflife, threshold):
+    """
+    Form of groups without any row yet, to be extended with extend_form
+
+    :param keys: Columns defining the groups
+    :param columns: Value columns
+    :param window: Number of rows of the rolling means
+    :param halflife: Number of rows after which a row weighs half in the
+        exponentially weighted means
+    :param threshold: Number of standard errors between a rolling mean and the
+        usual level of its group for the row to be flagged as a streak
+    """
+    n_columns = len(columns)
+    return {
+        "keys": list(keys),
+        "columns": list(columns),
+        "window": window,
+        "decay": 0.5 ** (1 / halflife),
+        "threshold": threshold,
+        "groups": pd.DataFrame(columns=list(keys)),
+        # One value per extended row, the rows of a group are in order
+        "group": np.zeros(0, dtype=int),
+        "order": np.zeros(0, dtype=int),
+        "rolling": np.zeros((n_columns, 0), dtype=np.float32),
+        "ewm": np.zeros((n_columns, 0), dtype=np.float32),
+        "flag": np.zeros((n_columns, 0), dtype=np.int8),
+        # State of each group after its last row
+        "last_order": np.zeros(0, dtype=int),
+        "tail": np.zeros((0, window - 1, n_columns)),
+        "decayed": np.zeros((0, 2, n_columns)),
+        "moments": np.zeros((0, 3, n_columns)),
+    }
+
+
+def extend_form(form, frame):
+    """
+    Rolling means, exponentially weighted means and streak flags of new rows,
+    for all groups and value columns at once
+
+    Only the new rows are computed, from the state kept for each group (last
+    values of the window, decayed sums and moments), the rows already in the
+    form are kept as they are. Rolling means of the first rows of a group are
+    over fewer rows. A row is flagged 1 (hot streak) or -1 (slump) when its
+    rolling mean is more than threshold standard errors above or below the mean
+    of the group up to it. Missing values are skipped.
+
+    Returns a new form, raises a ValueError when a group gets rows that are not
+    after its last row.
+
+    :param form: Form from empty_form or extend_form
+    :param frame: Data frame with the key columns, an integer "order" column
+        and the value columns
+    """
+    keys, columns, window = form["keys"], form["columns"], form["window"]
+    n_columns = len(columns)
+    frame = frame.sort_values([*keys, "order"], kind="stable")
+
+    # Group of each row, new groups are added after the known ones
+    known = pd.MultiIndex.from_frame(form["groups"].astype(object))
+    row_keys = pd.MultiIndex.from_frame(frame[keys].astype(object))
+    new_keys = row_keys.unique().difference(known, sort=False)
+    groups = pd.concat(
+        [form["groups"], new_keys.to_frame(index=False)], ignore_index=True
+    ).infer_objects()
+    group = pd.MultiIndex.from_frame(groups.astype(object)).get_indexer(row_keys)
+    n_new = len(new_keys)
+    state = {
+        "last_order": np.r_[form["last_order"], np.full(n_new, -1)],
+        "tail": np.concatenate(
+            [form["tail"], np.full((n_new, window - 1, n_columns), np.nan)]
+        ),
+        "decayed": np.concatenate([form["decayed"], np.zeros((n_new, 2, n_columns))]),
+        "moments": np.concatenate([form["moments"], np.zeros((n_new, 3, n_columns))]),
+    }
+
+    order = frame["order"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    ends = np.r_[starts[1:], len(group)]
+    if np.any(order[starts] <= state["last_order"][group[starts]]):
+        raise ValueError("Rows must be after the last row of their group")
+
+    # Columns first, so that the values of a column are contiguous
+    rolling = np.empty((n_columns, len(frame)), dtype=np.float32)
+    ewm = np.empty((n_columns, len(frame)), dtype=np.float32)
+    flag = np.empty((n_columns, len(frame)), dtype=np.int8)
+    values = frame[columns]
+    for g, start, end in zip(group[starts], starts, ends):
+        state["last_order"][g] = order[end - 1]
+        for chunk in range(start, end, chunk_rows):
+            rows = slice(chunk, min(chunk + chunk_rows, end))
+            extended = extend_group(
+                values.iloc[rows].to_numpy(dtype=float),
+                state["tail"][g],
+                state["decayed"][g],
+                state["moments"][g],
+                form["decay"],
+                form["threshold"],
+            )
+            rolling[:, rows], ewm[:, rows], flag[:, rows] = extended[:3]
+            state["tail"][g], state["decayed"][g], state["moments"][g] = extended[3:]
+
+    return {
+        **form,
+        **state,
+        "groups": groups,
+        "group": np.r_[form["group"], group],
+        "order": np.r_[form["order"], order],
+        "rolling": np.hstack([form["rolling"], rolling]),
+        "ewm": np.hstack([form["ewm"], ewm]),
+        "flag": np.hstack([form["flag"], flag]),
+    }
+
+
+def extend_group(values, tail, decayed, moments, decay, threshold):
+    """
+    Rolling means, exponentially weighted means and streak flags of new rows of
+    one group, and the state of the group after them
+
+    Returns the means and flags (columns first) followed by the new tail,
+    decayed sums and moments.
+
+    :param values: New values of the group, rows by columns, NaN where missing
+    :param tail: Last window - 1 values of the group, oldest first
+    :param decayed: Decayed sums of the values (0 where missing) and of their
+        presence
+    :param moments: Count, sum and sum of squares of the values present
+    :param decay: Weight of the previous decayed sums, between 0 and 1
+    :param threshold: Number of standard errors of a streak
+    """
+    window = len(tail) + 1
+    valid = np.isfinite(values)
+    filled = np.where(valid, values, 0)
+
+    # Rolling sums over the tail followed by the new rows
+    recent = np.vstack([tail, values])
+    recent_valid = np.isfinite(recent)
+    sums = np.cumsum(np.where(recent_valid, recent, 0), axis=0)
+    counts = np.cumsum(recent_valid, axis=0)
+    sums = np.vstack([np.zeros((1, sums.shape[1])), sums])
+    counts = np.vstack([np.zeros((1, counts.shape[1])), counts])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rolling = (sums[window:] - sums[:-window]) / (
+            counts[window:] - counts[:-window]
+        )
+
+    decayed_values = decayed_sums(filled, decay, decayed[0])
+    decayed_counts = decayed_sums(valid.astype(float), decay, decayed[1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ewm = decayed_values / decayed_counts
+
+    # Count, sum and sum of squares up to each row
+    count = np.cumsum(valid, axis=0) + moments[0]
+    total = np.cumsum(filled, axis=0) + moments[1]
+    total_squares = np.cumsum(filled * filled, axis=0) + moments[2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / count
+        variance = (total_squares - total * mean) / (count - 1)
+        z = (rolling - mean) / np.sqrt(variance / window)
+    settled = count >= 2 * window
+    flag = np.where(settled & (z > threshold), 1, 0)
+    flag = np.where(settled & (z < -threshold), -1, flag)
+
+    return (
+        rolling.T,
+        ewm.T,
+        flag.T,
+        recent[len(recent) - len(tail) :],
+        np.stack([decayed_values[-1], decayed_counts[-1]]),
+        np.stack([count[-1], total[-1], total_squares[-1]]),
+    )
+
+
+def decayed_sums(values, decay, carry):
+    """
+    Sums y = decay * y_previous + x over the rows, all columns at once
+
+    Within segments of rows short enough for decay ** -length to stay finite,
+    the sums are cumulative sums of scaled values, each segment starts from the
+    last sum of the previous one.
+
+    :param values: Array of rows
+    :param decay: Weight of the previous sum, between 0 and 1
+    :param carry: Sum before the first row
+    """
+    segment_rows = max(1, int(100 / -np.log10(decay)))
+    sums = np.empty_like(values)
+    for start in range(0, len(values), segment_rows):
+        segment = slice(start, start + segment_rows)
+        weights = decay ** np.arange(1, len(values[segment]) + 1)[:, None]
+        sums[segment] = (np.cumsum(values[segment] / weights, axis=0) + carry) * weights
+        carry = sums[segment][-1]
+    return sums
@@ -0,0 +1,29 @@
+"""
+Load the match history once and publish it as a store for the app workers
+
+Workers started with SAMUTRACKER_ATTACH=1 memory-map the columns of the store
+instead of each parsing the shards, and reload it when its version changes.
+
+Run from the repository root: python -m src.loader
+"""
+
+import time
+from src import shared
+
+
+def main():
+    shared.load_history(shared.raw_data_path)
+    if shared.load_error is not None:
+        raise shared.load_error
+    print(
+        shared.memory_report(shared.history_snapshot["match_history"])
+        .round(2)
+        .to_string(index=False)
+    )
+    while True:
+        time.sleep(shared.history_poll_secs)
+        shared.ingest_new_games(shared.raw_data_path)
+
+
+if __name__ == "__main__":
+    main()
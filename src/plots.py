@@ -1,8 +1,13 @@
-import plotly.express as px
-from src.shared import variables_dictionary_all
-from scipy.stats import pearsonr
+import numpy as np
+import pandas as pd
+from src.shared import large_plot_rows, plot_sample_rows, variables_dictionary_all
+from src.trend import fit_groups
 import plotly.graph_objects as go
 
+# plotly.express is slow to import, it is imported when a figure is first built
+# (the app warms it up in the background, see plot_modules)
+plot_modules = ["plotly.express"]
+
 
 def boxplot_stat(df, stat):
     """
@@ -11,6 +16,11 @@ def boxplot_stat(df, stat):
     :param df: Input data frame
     :param stat: Variable to plot
     """
+    import plotly.express as px
+
+    if len(df) > large_plot_rows:
+        return boxplot_large(df, stat)
+
     bp = px.box(
         df,
         x="FixedName",
@@ -19,6 +29,8 @@ def boxplot_stat(df, stat):
         labels=variables_dictionary_all,
         color="FixedName",
         template="plotly_white",
+        # Same order whatever the games, so that the figure can be patched
+        category_orders={"FixedName": sorted(df["FixedName"].unique())},
         custom_data=[
             "FixedName",
             variables_dictionary_all["date"],
@@ -50,16 +62,83 @@ def boxplot_stat(df, stat):
         hoverinfo="skip",
     )
     bp.update_layout(showlegend=False)
-    return go.FigureWidget(bp)
+    return bp
+
+
+def boxplot_large(df, stat):
+    """
+    Function for boxplots of many games, the quartiles and whiskers of the
+    boxes are computed from all the games and sent instead of the values, only
+    the outliers and a sample of the other points are drawn, with WebGL
+
+    :param df: Input data frame
+    :param stat: Variable to plot
+    """
+    import plotly.express as px
+
+    stats, outlier = box_stats(df, stat)
+    points = df
+    if len(df) > plot_sample_rows:
+        points = df[outlier | sample_rows(df, plot_sample_rows)]
+    players = sorted(df["FixedName"].unique())
+    fig = px.scatter(
+        points,
+        x="FixedName",
+        y=stat,
+        labels=variables_dictionary_all,
+        color="FixedName",
+        template="plotly_white",
+        category_orders={"FixedName": players},
+        render_mode="webgl",
+        custom_data=[
+            "FixedName",
+            variables_dictionary_all["date"],
+            stat,
+            variables_dictionary_all["timestamp"],
+        ],
+    )
+    fig.update_traces(
+        hovertemplate=f"<b>Player:</b> %{{customdata[0]}}<br>"
+        f"<b>Date:</b> %{{customdata[1]}}<br>"
+        f"<b>{stat}:</b> %{{y}}<br><extra></extra>"
+    )
+    # Boxes without points, drawn from their statistics at their name, in the
+    # order of the players
+    colors = {trace.name: trace.marker.color for trace in fig.data}
+    for player, box in stats.reindex(players).dropna().iterrows():
+        fig.add_box(
+            x=[player],
+            q1=[box["q1"]],
+            median=[box["median"]],
+            q3=[box["q3"]],
+            lowerfence=[box["lowerfence"]],
+            upperfence=[box["upperfence"]],
+            name=player,
+            marker_color=colors.get(player),
+            boxpoints=False,
+            hoveron="boxes",
+        )
+    fig.add_scattergl(
+        x=[],
+        y=[],
+        mode="markers",
+        marker=dict(
+            size=40, color="black", symbol="line-ew", line=dict(width=3, color="black")
+        ),
+        name="highlight",
+        hoverinfo="skip",
+    )
+    fig.update_layout(showlegend=False)
+    return fig
 
 
 def scatterplot_interactive(df, x, y, trend, scope):
-    # Compute correlation coefficient
-    r, _ = pearsonr(df[x], df[y])
-    corr_text = f"r² = {r*r:.2f}"
+    import plotly.express as px
 
+    # Many games: only a sample of the points is drawn, with WebGL
+    large = len(df) > large_plot_rows
     fig = px.scatter(
-        df,
+        decimate(df, [x, y], plot_sample_rows) if large else df,
         x=x,
         y=y,
         color="FixedName",
@@ -71,20 +150,10 @@ def scatterplot_interactive(df, x, y, trend, scope):
         ],
         labels=variables_dictionary_all,
         template="plotly_white",
-        trendline=trend,
-        trendline_scope=scope,
+        category_orders={"FixedName": sorted(df["FixedName"].unique())},
+        render_mode="webgl" if large else "auto",
     )
 
-    if scope == "overall" and trend == "ols":
-        # Add correlation as annotation
-        fig.add_annotation(
-            x=df[x].max(),
-            y=df[y].min(),
-            text=corr_text,
-            showarrow=False,
-            font=dict(size=12, color="#a16300"),
-        )
-
     x_lab = x
     y_lab = y
     fig.update_traces(
@@ -93,22 +162,88 @@ def scatterplot_interactive(df, x, y, trend, scope):
         f"<b>{x_lab}:</b> %{{x}}<br>"
         f"<b>{y_lab}:</b> %{{y}}<br><extra></extra>"
     )
-    fig.add_scatter(
-        x=[], y=[], mode="markers", marker=dict(), name="highlight", hoverinfo="skip"
+
+    # No line through less than two games
+    if trend == "ols" and len(df) >= 2:
+        fits = add_trendlines(fig, df, x, y, scope, large)
+        if scope == "overall":
+            # Add correlation as annotation
+            fig.add_annotation(
+                x=df[x].max(),
+                y=df[y].min(),
+                text=f"r² = {fits['r2'].iloc[0]:.2f}",
+                showarrow=False,
+                font=dict(size=12, color="#a16300"),
+            )
+
+    highlight = go.Scattergl if large else go.Scatter
+    fig.add_trace(
+        highlight(
+            x=[],
+            y=[],
+            mode="markers",
+            marker=dict(),
+            name="highlight",
+            hoverinfo="skip",
+        )
     )
 
-    return go.FigureWidget(fig)
+    return fig
+
+
+def add_trendlines(fig, df, x, y, scope, large=False):
+    """
+    Add least squares lines of y on x to a scatter plot, their hover shows the
+    slope, r² and number of games of each line
+
+    Returns the fits of the lines (see trend.fit_lines).
+
+    :param fig: Scatter plot with one trace per player
+    :param df: Input data frame
+    :param x: Explanatory variable
+    :param y: Explained variable
+    :param scope: "overall" for one line, "trace" for one line per player
+    :param large: Draw the lines with WebGL
+    """
+    if scope == "overall":
+        fits = fit_groups(df[x], df[y], np.zeros(len(df), dtype=int))
+        fits = fits.rename(index={0: "Overall"}).reindex(["Overall"])
+        colorway = fig.layout.template.layout.colorway
+        colors = {"Overall": colorway[len(fig.data) % len(colorway)]}
+    else:
+        fits = fit_groups(df[x], df[y], df["FixedName"])
+        colors = {trace.name: trace.marker.color for trace in fig.data}
+
+    line = go.Scattergl if large else go.Scatter
+    for name, fit in fits.dropna(subset=["slope"]).iterrows():
+        # Straight lines, their ends are enough
+        x_ends = np.array([fit["x_min"], fit["x_max"]])
+        fig.add_trace(
+            line(
+                x=x_ends,
+                y=fit["slope"] * x_ends + fit["intercept"],
+                mode="lines",
+                line_color=colors.get(name),
+                name=name,
+                showlegend=False,
+                hovertemplate=f"<b>{name}</b><br>"
+                f"{y} = {fit['slope']:.3g} × {x} + {fit['intercept']:.3g}<br>"
+                f"<b>r²:</b> {fit['r2']:.2f}<br>"
+                f"<b>Games:</b> {int(fit['n'])}<extra></extra>",
+            )
+        )
+    return fits
 
 
 def winrate_plot(df):
-    df = (
-        df.groupby("FixedName")[variables_dictionary_all["gamewin"]]
-        .value_counts(normalize=True)
-        .unstack(fill_value=0)
-        .reset_index()
-        .rename_axis(None, axis=1)
-    )
-    df[["Winrate"]] = round(df[["win"]] * 100, 2)
+    """
+    Function for winrates barplot
+
+    :param df: Summary with one row per player, from shared.summary_totals
+    """
+    import plotly.express as px
+
+    df = df.sort_values("FixedName")
     fig = px.bar(
         df,
         x="FixedName",
@@ -122,5 +257,316 @@ def winrate_plot(df):
         f"<b>Winrate (%):</b> %{{customdata[1]}}<br>"
     )
     fig.update_yaxes(range=[0, 100])
-    fig = go.FigureWidget(fig)
     return fig
+
+
+def correlation_heatmap(matrix):
+    """
+    Function for the heatmap of a correlation matrix
+
+    :param matrix: Correlation matrix, from shared.correlations
+    """
+    # Pairs without correlation (constant variable) are sent as nulls
+    z = matrix.to_numpy()
+    fig = go.Figure(
+        go.Heatmap(
+            z=np.where(np.isnan(z), None, z),
+            x=list(matrix.columns),
+            y=list(matrix.index),
+            zmin=-1,
+            zmax=1,
+            colorscale="RdBu",
+            hovertemplate="<b>%{x}</b><br><b>%{y}</b><br>r = %{z:.2f}<extra></extra>",
+        )
+    )
+    fig.update_layout(template="plotly_white", yaxis_autorange="reversed")
+    fig.update_xaxes(tickfont_size=8, showgrid=False)
+    fig.update_yaxes(tickfont_size=8, showgrid=False)
+    return fig
+
+
+def pair_heatmap(df, relation):
+    """
+    Function for the heatmap of the winrates of pairs of players, with their
+    number of games and confidence interval on hover
+
+    :param df: Winrates of the pairs, from shared.pair_winrates
+    :param relation: "together" (same team) or "against" (opposing teams)
+    """
+    players = df["Player"].unique()
+    shape = (len(players), len(players))
+    winrate = df["Winrate"].to_numpy().reshape(shape)
+    customdata = np.dstack(
+        [df[c].to_numpy().reshape(shape) for c in ["Games", "Wins", "Low", "High"]]
+    )
+    customdata = np.where(np.isnan(customdata), None, customdata)
+    record = "with" if relation == "together" else "against"
+    fig = go.Figure(
+        go.Heatmap(
+            # Pairs without games (no winrate nor interval) are sent as nulls
+            z=np.where(np.isnan(winrate), None, winrate),
+            x=list(players),
+            y=list(players),
+            zmin=0,
+            zmax=100,
+            zmid=50,
+            colorscale="RdBu",
+            customdata=customdata,
+            hovertemplate=f"<b>%{{y}}</b> {record} <b>%{{x}}</b><br>"
+            "Winrate (%): %{z:.1f} [%{customdata[2]:.1f}, %{customdata[3]:.1f}]<br>"
+            "Wins: %{customdata[1]} / %{customdata[0]} games<extra></extra>",
+        )
+    )
+    fig.update_layout(template="plotly_white", yaxis_autorange="reversed")
+    fig.update_xaxes(showgrid=False)
+    fig.update_yaxes(showgrid=False)
+    return fig
+
+
+def form_lineplot(df, stat):
+    """
+    Function for the form of the players over time: exponentially weighted mean
+    (solid), rolling mean (dashed), hot streaks and slumps (triangles)
+
+    :param df: Form of the players, from shared.form_view
+    :param stat: Variable of the form
+    """
+    from plotly.colors import qualitative
+
+    timestamp = variables_dictionary_all["timestamp"]
+    scatter = go.Scattergl if len(df) > large_plot_rows else go.Scatter
+    fig = go.Figure()
+    for i, (player, rows) in enumerate(df.groupby("FixedName", sort=True)):
+        color = qualitative.Plotly[i % len(qualitative.Plotly)]
+        fig.add_trace(
+            scatter(
+                x=rows[timestamp],
+                y=rows["EWM"],
+                mode="lines",
+                name=player,
+                legendgroup=player,
+                line=dict(color=color),
+                hovertemplate=f"<b>Player:</b> {player}<br>"
+                f"<b>{stat} (EWM):</b> %{{y:.2f}}<extra></extra>",
+            )
+        )
+        fig.add_trace(
+            scatter(
+                x=rows[timestamp],
+                y=rows["Rolling"],
+                mode="lines",
+                name=f"{player} rolling",
+                legendgroup=player,
+                showlegend=False,
+                line=dict(color=color, dash="dash"),
+                hovertemplate=f"<b>Player:</b> {player}<br>"
+                f"<b>{stat} (rolling):</b> %{{y:.2f}}<extra></extra>",
+            )
+        )
+        streaks = rows[rows["Flag"] != 0]
+        fig.add_trace(
+            scatter(
+                x=streaks[timestamp],
+                y=streaks["Rolling"],
+                mode="markers",
+                name=f"{player} streaks",
+                legendgroup=player,
+                showlegend=False,
+                marker=dict(
+                    color=color,
+                    size=10,
+                    symbol=np.where(
+                        streaks["Flag"] > 0, "triangle-up", "triangle-down"
+                    ),
+                ),
+                customdata=np.where(streaks["Flag"] > 0, "Hot streak", "Slump"),
+                hovertemplate=f"<b>Player:</b> {player}<br>"
+                f"<b>%{{customdata}}:</b> %{{y:.2f}}<extra></extra>",
+            )
+        )
+    fig.update_layout(template="plotly_white", yaxis_title=stat, legend_orientation="h")
+    return fig
+
+
+def patch_figure(widget, fig):
+    """
+    Update a FigureWidget in place to show a new figure, only the properties
+    that changed are sent to the browser
+
+    Returns False without updating the widget when the traces of the figure do
+    not match those of the widget (types and names), it has to be rebuilt then.
+
+    :param widget: FigureWidget displayed by the app
+    :param fig: New figure
+    """
+    if figure_traces(widget) != figure_traces(fig):
+        return False
+
+    with widget.batch_update():
+        for trace, new_trace in zip(widget.data, fig.data):
+            patch_properties(trace, new_trace.to_plotly_json(), keep=["uid"])
+        # The template and margins are set once, when the widget is built
+        patch_properties(
+            widget.layout,
+            fig.layout.to_plotly_json(),
+            keep=["template", "margin"],
+        )
+    return True
+
+
+def figure_traces(fig):
+    """
+    Types and names of the traces of a figure, a widget can be patched with a
+    figure that has the same traces
+
+    :param fig: Figure or FigureWidget
+    """
+    return tuple((trace.type, trace.name) for trace in fig.data)
+
+
+def patch_properties(obj, new, keep=()):
+    """
+    Set the properties of a figure object to new ones, and reset the ones
+    missing from them
+
+    plotly compares each value with the current one (arrays included) and
+    only sends the ones that changed.
+
+    :param obj: Trace or layout of a FigureWidget
+    :param new: New properties, as a dictionary
+    :param keep: Properties left unchanged
+    """
+    for key in obj.to_plotly_json().keys() - new.keys() - set(keep):
+        obj[key] = None
+    for key, value in new.items():
+        if key not in keep:
+            obj[key] = value
+
+
+def decimate(df, columns, n_rows, by="FixedName", seed=0):
+    """
+    Stratified sample of the rows of a data frame that keeps the outliers
+
+    Each group keeps a share of n_rows proportional to its size (at least one
+    row) plus its rows outside the whiskers (1.5 IQR) of any of the columns.
+    The sample is seeded, the same data always gives the same points.
+
+    :param df: Input data frame
+    :param columns: Columns where outliers are kept
+    :param n_rows: Approximate number of rows to keep besides the outliers
+    :param by: Column defining the groups
+    :param seed: Seed of the random generator
+    """
+    if len(df) <= n_rows:
+        return df
+    outlier = np.zeros(len(df), dtype=bool)
+    for column in columns:
+        outlier |= box_stats(df, column, by)[1]
+    return df[outlier | sample_rows(df, n_rows, by, seed)]
+
+
+def sample_rows(df, n_rows, by="FixedName", seed=0):
+    """
+    Rows of a stratified sample of a data frame, each group keeps a share of
+    n_rows proportional to its size (at least one row)
+
+    :param df: Input data frame
+    :param n_rows: Approximate number of rows to keep
+    :param by: Column defining the groups
+    :param seed: Seed of the random generator
+    """
+    # Rank of each row in its group, in a random order
+    order = np.random.default_rng(seed).permutation(len(df))
+    rank = np.empty(len(df), dtype=int)
+    rank[order] = df.iloc[order].groupby(by, sort=False).cumcount().to_numpy()
+    size = df.groupby(by, sort=False)[by].transform("size").to_numpy()
+    return rank < np.maximum(1, size * n_rows // len(df))
+
+
+def box_stats(df, column, by="FixedName"):
+    """
+    Statistics of the boxes of a column per group, as plotly computes them
+    (linear quartiles, whiskers at the furthest values within 1.5 IQR), and
+    whether each row is an outlier
+
+    Returns a data frame with q1, median, q3, lowerfence and upperfence per
+    group with values, and a boolean array over the rows of df.
+
+    :param df: Input data frame
+    :param column: Column of the values
+    :param by: Column defining the groups
+    """
+    quartiles = df.groupby(by, sort=False)[column].quantile([0.25, 0.5, 0.75])
+    quartiles = quartiles.unstack()
+    quartiles.columns = ["q1", "median", "q3"]
+
+    # Fences of each row, from the quartiles of its group
+    group = quartiles.index.get_indexer(df[by])
+    q1 = quartiles["q1"].to_numpy()[group]
+    q3 = quartiles["q3"].to_numpy()[group]
+    values = df[column].to_numpy(dtype=float)
+    inside = (values >= q1 - 1.5 * (q3 - q1)) & (values <= q3 + 1.5 * (q3 - q1))
+    outlier = np.isfinite(values) & ~inside
+    within = pd.Series(np.where(inside, values, np.nan)).groupby(group)
+    quartiles["lowerfence"] = within.min().to_numpy()
+    quartiles["upperfence"] = within.max().to_numpy()
+    quartiles = quartiles.dropna()
+    return quartiles, outlier
+
+
+def hover_index(fig):
+    """
+    Index the points of a figure by game time stamp, so that the points of a
+    hovered game are found without scanning the traces
+
+    Returns a dictionary time stamp: dictionary of the traces, point indices,
+    x and y values and colors of the points of this game.
+
+    :param fig: Figure with the game time stamp as 4th custom data column, as
+        built by boxplot_stat and scatterplot_interactive
+    """
+    points = []
+    for i, trace in enumerate(fig.data):
+        if trace.customdata is None or len(trace.customdata) == 0:
+            continue
+        points.append(
+            pd.DataFrame(
+                {
+                    "timestamp": np.asarray(trace.customdata)[:, 3],
+                    "trace": i,
+                    "point": np.arange(len(trace.customdata)),
+                    "x": trace.x,
+                    "y": trace.y,
+                    "color": trace.marker.color,
+                }
+            )
+        )
+    if not points:
+        return {}
+
+    points = pd.concat(points, ignore_index=True).sort_values(
+        "timestamp", kind="stable"
+    )
+    columns = {c: points[c].to_numpy() for c in points.columns.drop("timestamp")}
+    games, starts = np.unique(points["timestamp"].to_numpy(), return_index=True)
+    ends = np.r_[starts[1:], len(points)]
+    return {
+        game: {c: values[start:end] for c, values in columns.items()}
+        for game, start, end in zip(games, starts, ends)
+    }
+
+
+def highlight_points(widget, game_points, star=False):
+    """
+    Show the points of a game on the highlight trace (last trace) of a widget
+
+    :param widget: FigureWidget built from boxplot_stat or scatterplot_interactive
+    :param game_points: Points of the game from hover_index, None to clear
+    :param star: Draw the points as stars of the color of the players
+    """
+    with widget.batch_update():
+        highlight = widget.data[-1]
+        highlight.x = game_points["x"] if game_points else []
+        highlight.y = game_points["y"] if game_points else []
+        if star and game_points:
+            highlight.marker = dict(size=14, color=game_points["color"], symbol="star")
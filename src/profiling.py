@@ -0,0 +1,195 @@
+from datetime import datetime
+import functools
+import json
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# Upper edges of the duration buckets of the histograms, in milliseconds
+bucket_edges_ms = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, np.inf]
+
+
+class Profiler:
+    """
+    Duration, row count and payload size of the calls of the profiled functions
+
+    Each function keeps a histogram of its durations, calls can also be
+    appended to a JSON lines log. A disabled profiler returns the functions
+    unchanged, it costs nothing.
+
+    :param enabled: Record the calls
+    :param log_path: Optional file where each call is appended as a JSON line
+    """
+
+    def __init__(self, enabled=False, log_path=None):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.functions = {}
+        self.lock = threading.Lock()
+
+    def profile(self, function=None, name=None):
+        """
+        Decorator recording the calls of a function, used bare or with a name
+
+        :param function: Function to profile
+        :param name: Name of the records, the function name by default
+        """
+        if function is None:
+            return functools.partial(self.profile, name=name)
+        if not self.enabled:
+            return function
+
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            return self.call(name or function.__name__, function, *args, **kwargs)
+
+        return profiled
+
+    def call(self, name, function, *args, **kwargs):
+        """
+        Call a function and record its duration and output
+
+        :param name: Name of the record
+        :param function: Function to call with the other arguments
+        """
+        if not self.enabled:
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            output = function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+        rows, size = output_size(output)
+        self.record(name, seconds, rows, size)
+        return output
+
+    def record(self, name, seconds, rows=None, size=None):
+        """
+        Record one call
+
+        :param name: Name of the profiled function
+        :param seconds: Duration of the call
+        :param rows: Number of rows of the output, if it is a table
+        :param size: Size of the output sent to the browser in bytes
+        """
+        bucket = np.searchsorted(bucket_edges_ms, seconds * 1000)
+        with self.lock:
+            stats = self.functions.setdefault(
+                name,
+                {
+                    "calls": 0,
+                    "seconds": 0.0,
+                    "max": 0.0,
+                    "rows": None,
+                    "bytes": None,
+                    "histogram": np.zeros(len(bucket_edges_ms), dtype=int),
+                },
+            )
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            stats["histogram"][bucket] += 1
+            if rows is not None:
+                stats["rows"] = rows
+            if size is not None:
+                stats["bytes"] = size
+            if self.log_path is not None:
+                with open(self.log_path, "a") as f:
+                    record = {
+                        "time": datetime.now().isoformat(timespec="milliseconds"),
+                        "name": name,
+                        "seconds": seconds,
+                        "rows": rows,
+                        "bytes": size,
+                    }
+                    f.write(json.dumps(record) + "\n")
+
+    def summary(self):
+        """
+        Calls, durations, last row count and last payload size per function,
+        slowest in total first
+
+        Percentiles are the upper edges of their histogram buckets.
+        """
+        with self.lock:
+            rows = [
+                {
+                    "Function": name,
+                    "Calls": stats["calls"],
+                    "Total (s)": stats["seconds"],
+                    "Mean (ms)": stats["seconds"] / stats["calls"] * 1000,
+                    "p50 (ms)": histogram_quantile(stats["histogram"], 0.5),
+                    "p95 (ms)": histogram_quantile(stats["histogram"], 0.95),
+                    "Max (ms)": stats["max"] * 1000,
+                    "Rows": stats["rows"],
+                    "KB": None if stats["bytes"] is None else stats["bytes"] / 1024,
+                }
+                for name, stats in self.functions.items()
+            ]
+        summary = pd.DataFrame(rows, columns=summary_columns)
+        return summary.sort_values("Total (s)", ascending=False, ignore_index=True)
+
+    def histograms(self):
+        """
+        Number of calls per duration bucket (columns, upper edges) and function
+        """
+        with self.lock:
+            counts = {
+                name: stats["histogram"].copy()
+                for name, stats in self.functions.items()
+            }
+        labels = [f"<{edge:g} ms" for edge in bucket_edges_ms]
+        return pd.DataFrame.from_dict(counts, orient="index", columns=labels)
+
+    def reset(self):
+        """
+        Drop all the records
+        """
+        with self.lock:
+            self.functions.clear()
+
+
+summary_columns = [
+    "Function",
+    "Calls",
+    "Total (s)",
+    "Mean (ms)",
+    "p50 (ms)",
+    "p95 (ms)",
+    "Max (ms)",
+    "Rows",
+    "KB",
+]
+
+
+def histogram_quantile(histogram, q):
+    """
+    Upper edge of the bucket of a quantile of the durations, in milliseconds
+
+    :param histogram: Number of calls per bucket of bucket_edges_ms
+    :param q: Quantile between 0 and 1
+    """
+    bucket = np.searchsorted(np.cumsum(histogram), q * histogram.sum())
+    return bucket_edges_ms[bucket]
+
+
+def output_size(output):
+    """
+    Number of rows and size in bytes of what a profiled function returned,
+    None when they do not apply
+
+    Figures are serialized to JSON to measure them, which is only paid when
+    profiling.
+
+    :param output: Returned value
+    """
+    if isinstance(output, (pd.DataFrame, np.ndarray)):
+        return len(output), None
+    if isinstance(getattr(output, "data", None), pd.DataFrame):
+        return len(output.data), None  # DataGrid and DataTable
+    if hasattr(output, "to_plotly_json"):
+        return None, len(output.to_json())
+    if isinstance(output, str) or type(output).__name__ == "HTML":
+        return None, len(str(output).encode())
+    return None, None
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+# Values of the game by player encoding multiplied at once by pair_records, to
+# bound its memory with many players and games
+pair_chunk_values = 2**24
+
+
+def roster_index(timestamps, ids, teams, players):
+    """
+    Build boolean roster matrices with one row per game and one column per player
+
+    :param timestamps: Game time stamp of each match history row
+    :param ids: Account ID of each match history row
+    :param teams: Team ("blue" or "orange") of each match history row
+    :param players: Account IDs of the players to index
+    """
+    game_idx, games = pd.factorize(np.asarray(timestamps), sort=True)
+    players = list(players)
+    player_idx = player_positions(ids, players)
+    keep = player_idx >= 0
+    is_blue = np.asarray(teams) == "blue"
+
+    present = np.zeros((len(games), len(players)), dtype=bool)
+    present[game_idx[keep], player_idx[keep]] = True
+    blue = np.zeros((len(games), len(players)), dtype=bool)
+    blue[game_idx[keep & is_blue], player_idx[keep & is_blue]] = True
+
+    return {
+        "games": np.asarray(games),
+        "players": pd.Index(players),
+        "present": present,
+        "blue": blue,
+        "orange": present & ~blue,
+    }
+
+
+def player_positions(ids, players):
+    """
+    Position of the Account ID of each row in a list of players, -1 for the
+    other players
+
+    Categorical Account IDs are looked up once per category, the rows only
+    index the result with their codes.
+
+    :param ids: Account ID of each row
+    :param players: Account IDs of the players
+    """
+    players = pd.Index(list(players), dtype=object)
+    if isinstance(getattr(ids, "dtype", None), pd.CategoricalDtype):
+        # Code -1 (missing Account ID) picks the trailing -1
+        positions = np.r_[players.get_indexer(ids.cat.categories), -1]
+        return positions[ids.cat.codes.to_numpy()]
+    return players.get_indexer(np.asarray(ids, dtype=object))
+
+
+def select_games(index, include=(), exclude=(), min_included=None, teams="any"):
+    """
+    Select games from a roster index with vectorized operations on its matrices
+
+    :param index: Roster index from roster_index
+    :param include: Account IDs of players that must play the game
+    :param exclude: Account IDs of players that must not play the game
+    :param min_included: Minimum number of included players in the game, all
+        included players are required if None or 0
+    :param teams: Team constraint on the included players present in the game,
+        "any", "same" (all on one team) or "opposing" (on both teams)
+    """
+    include = index["players"].get_indexer(list(include))
+    exclude = index["players"].get_indexer(list(exclude))
+    present = index["present"]
+
+    mask = ~present[:, exclude].any(axis=1)
+    if len(include):
+        n_included = present[:, include].sum(axis=1)
+        mask &= n_included >= (min_included or len(include))
+        n_blue = index["blue"][:, include].sum(axis=1)
+        n_orange = index["orange"][:, include].sum(axis=1)
+        if teams == "same":
+            mask &= (n_blue == 0) | (n_orange == 0)
+        elif teams == "opposing":
+            mask &= (n_blue > 0) & (n_orange > 0)
+
+    return index["games"][mask]
+
+
+def pair_records(index, game_ids, winner):
+    """
+    Games and wins of every pair of players, on the same team and on opposing
+    teams
+
+    Games are encoded as three game by player matrices: presence, team (1 for
+    blue, -1 for orange) and win. One product of the encoding with itself gives
+    all the counts: presence by presence counts the games of each pair, team by
+    team the same team games minus the opposing ones, win by win the wins
+    together and win by presence the wins of a player with or against another.
+
+    Returns a dictionary relation ("together" or "against"): (games, wins)
+    matrices, players by players. [i, j] counts the games where i plays with
+    (or against) j and the wins of i, the diagonal of together is the record of
+    each player.
+
+    :param index: Roster index from roster_index
+    :param game_ids: Rows of the roster index to count
+    :param winner: Winning team of each game ("blue", "orange" or "draw")
+    """
+    game_ids = np.asarray(game_ids, dtype=int)
+    # Only the players of these games are encoded
+    players = np.flatnonzero(index["present"][game_ids].any(axis=0))
+    n_players = len(players)
+    products = np.zeros((3 * n_players, 3 * n_players))
+    chunk_games = max(1, pair_chunk_values // (3 * n_players or 1))
+    for start in range(0, len(game_ids), chunk_games):
+        chunk = game_ids[start : start + chunk_games]
+        blue = index["blue"][np.ix_(chunk, players)]
+        orange = index["orange"][np.ix_(chunk, players)]
+        blue_won = (np.asarray(winner)[chunk] == "blue")[:, None]
+        orange_won = (np.asarray(winner)[chunk] == "orange")[:, None]
+        encoding = np.hstack(
+            [
+                blue | orange,
+                blue.astype(np.int8) - orange,
+                (blue & blue_won) | (orange & orange_won),
+            ],
+            dtype=np.float32,
+        )
+        # Counts of a chunk are exact in float32, they are summed in float64
+        products += encoding.T @ encoding
+
+    blocks = products.reshape(3, n_players, 3, n_players).transpose(0, 2, 1, 3)
+    present, team, won = range(3)
+    records = {
+        "together": (
+            (blocks[present, present] + blocks[team, team]) / 2,
+            blocks[won, won],
+        ),
+        # Wins against another player: wins in the games where they both play
+        # minus the wins together
+        "against": (
+            (blocks[present, present] - blocks[team, team]) / 2,
+            blocks[won, present] - blocks[won, won],
+        ),
+    }
+    for relation, matrices in records.items():
+        records[relation] = tuple(
+            expand(matrix, players, len(index["players"])) for matrix in matrices
+        )
+    return records
+
+
+def expand(matrix, players, n_players):
+    """
+    Players by players matrix of all the players from the matrix of some of
+    them, zero elsewhere
+
+    :param matrix: Matrix of the players
+    :param players: Positions of the players among all the players
+    :param n_players: Number of players
+    """
+    expanded = np.zeros((n_players, n_players))
+    expanded[np.ix_(players, players)] = matrix
+    return expanded
+
+
+def wilson_interval(wins, games, z=1.96):
+    """
+    Wilson score interval of winrates, missing without games
+
+    :param wins: Numbers of wins
+    :param games: Numbers of games
+    :param z: Quantile of the normal distribution, 1.96 for 95%
+    """
+    wins = np.asarray(wins, dtype=float)
+    games = np.asarray(games, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = wins / games
+        center = (rate + z * z / (2 * games)) / (1 + z * z / games)
+        half_width = (
+            z
+            * np.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games))
+            / (1 + z * z / games)
+        )
+    return center - half_width, center + half_width
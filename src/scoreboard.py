@@ -0,0 +1,110 @@
+import numpy as np
+from src.percentiles import top_share
+from src.variables import variables_dictionary_all
+
+# Columns of the scoreboard of a game, the team only colors the rows
+scoreboard_columns = [
+    variables_dictionary_all["team"],
+    variables_dictionary_all["player"],
+    variables_dictionary_all["core_score"],
+    variables_dictionary_all["core_goals"],
+    variables_dictionary_all["core_saves"],
+    variables_dictionary_all["core_shots"],
+    variables_dictionary_all["demo_inflicted"],
+]
+
+
+def game_rows(match_history, games, timestamp):
+    """
+    Rows of the players of a game, found by a binary search in the games table
+    instead of a scan of the history
+
+    :param match_history: Match history from game_index
+    :param games: Games table from game_index, sorted by time stamp
+    :param timestamp: Time stamp of the game, no rows if None or unknown
+    """
+    if timestamp is None:
+        return match_history.iloc[:0]
+    game = games["timestamp"].searchsorted(timestamp)
+    if game == len(games) or games["timestamp"].iloc[game] != timestamp:
+        return match_history.iloc[:0]
+    first_row = games["first_row"].iloc[game]
+    return match_history.iloc[first_row : first_row + games["n_rows"].iloc[game]]
+
+
+def game_scoreboard(match_history, games, timestamp, rank_tables=None, ranked=None):
+    """
+    HTML table of the players of a game, colored by team, with the rank of
+    their variables among all the games of the mode when rank tables are given
+
+    :param match_history: Match history from game_index
+    :param games: Games table from game_index
+    :param timestamp: Time stamp of the game, an empty table if None
+    :param rank_tables: Sorted values per game mode, from
+        percentiles.extend_rank_tables
+    :param ranked: Dictionary label: column of the ranked variables
+    """
+    rows = game_rows(match_history, games, timestamp)
+    game_out = rows[scoreboard_columns]
+    if rank_tables is not None:
+        game_out = game_out.assign(
+            **{"Rank in mode": rank_labels(rows, rank_tables, ranked)}
+        )
+    styled = (
+        game_out.style.apply(highlight_scores, axis=1)
+        .hide(subset=[variables_dictionary_all["team"]], axis="columns")
+        .hide(axis="index")
+        .set_table_styles(
+            [
+                {"selector": "", "props": [("border", "2px solid grey")]},
+                {
+                    "selector": "tbody td",
+                    "props": [("border", "1px solid grey")],
+                },
+                {
+                    "selector": "th",
+                    "props": [
+                        ("border", "1px solid grey"),
+                        ("text-align", "left"),
+                        ("padding-left", "4px"),
+                        ("font-size", "12px"),
+                    ],
+                },
+            ]
+        )
+        .set_properties(
+            **{"text-align": "left", "padding-left": "4px", "font-size": "12px"}
+        )
+    )
+    return styled.to_html()
+
+
+def rank_labels(rows, rank_tables, ranked):
+    """
+    Where the variables of each player of a game rank among all the games of
+    the mode, as "top 7% saves"
+
+    :param rows: Rows of the players of a game, from game_rows
+    :param rank_tables: Sorted values per game mode, from
+        percentiles.extend_rank_tables
+    :param ranked: Dictionary label: column of the ranked variables
+    """
+    labels = [[] for _ in range(len(rows))]
+    if len(rows) == 0:
+        return labels
+    table = rank_tables.get(rows[variables_dictionary_all["gamemode"]].iloc[0], {})
+    for label, column in ranked.items():
+        shares = top_share(table.get(column, []), rows[column])
+        for player_labels, share in zip(labels, shares):
+            if np.isfinite(share):
+                player_labels.append(f"top {max(1, round(share * 100))}% {label}")
+    return [", ".join(player_labels) for player_labels in labels]
+
+
+def highlight_scores(val):
+    team_color = list(val)[0]
+    if team_color == "blue":
+        return ["background-color: lightskyblue"] * len(val)
+    elif team_color == "orange":
+        return ["background-color: lightsalmon"] * len(val)
+    return [""] * len(val)
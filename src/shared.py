@@ -1,163 +1,397 @@
 from pathlib import Path
 import pandas as pd
 import glob
+import os
+import sys
 import yaml
 import numpy as np
+import functools
+import importlib
+import inspect
+import logging
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.cache import LRUCache
+from src.cube import build_cube, cube_totals_masked, cube_totals_since
+from src.form import empty_form, extend_form
+from src.percentiles import extend_rank_tables
+from src.profiling import Profiler
+from src.roster import (
+    pair_records,
+    player_positions,
+    roster_index,
+    select_games,
+    wilson_interval,
+)
+from src.store import (
+    read_meta,
+    read_store,
+    source_signature,
+    store_is_current,
+    store_version,
+    write_store,
+)
+from src.scoreboard import game_scoreboard
+from src.trend import correlation_matrix
+from src.variables import text_variables, variables_dictionary_all
 
 app_dir = Path(__file__).parent / ".."
 threshold_score = 100
 with open("tracked_players.yml", "r") as f:
     tracked_players = yaml.safe_load(f)
-raw_data_path = app_dir / "data"
-
-variables_dictionary_all = {
-    "team": "Team",
-    "player": "Player name",
-    "id": "Account ID",
-    "FixedName": "Player",
-    "timestamp": "Time stamp",
-    "date": "Date",
-    "time": "Time",
-    "core_shots": "Shots",
-    "core_shots_against": "Shots opponents",
-    "core_goals": "Goals",
-    "core_goals_against": "Goals opponents",
-    "core_saves": "Saves",
-    "core_assists": "Assists",
-    "core_score": "Score",
-    "core_mvp": "MVP",
-    "core_shooting_percentage": "Successful shots (%)",
-    "boost_bpm": "Boost used (u/min)",
-    "boost_bcpm": "Boost collected (u/min)",
-    "boost_avg_amount": "Average boost",
-    "boost_amount_collected": "Total boost collected",
-    "boost_amount_stolen": "Boost stolen",
-    "boost_amount_collected_big": "Boost collected (big pads)",
-    "boost_amount_stolen_big": "Boost stolen (big pads)",
-    "boost_amount_collected_small": "Boost collected (small pads)",
-    "boost_amount_stolen_small": "Boost stolen (small pads)",
-    "boost_count_collected_big": "Boost collected (n big pads)",
-    "boost_count_stolen_big": "Boost stolen (n big pads)",
-    "boost_count_collected_small": "Boost collected (n small pads)",
-    "boost_count_stolen_small": "Boost stolen (n small pads)",
-    "boost_amount_overfill": "Boost overfill",
-    "boost_amount_overfill_stolen": "Boost overfill stolen",
-    "boost_amount_used_while_supersonic": "Boost wasted while supersonic",
-    "boost_time_zero_boost": "Time at zero boost (s)",
-    "boost_percent_zero_boost": "Time at zero boost (%)",
-    "boost_time_full_boost": "Time at full boost (s)",
-    "boost_percent_full_boost": "Time at full boost (%)",
-    "boost_time_boost_0_25": "Time boost 0-25 (s)",
-    "boost_time_boost_25_50": "Time boost 25-50 (s)",
-    "boost_time_boost_50_75": "Time boost 50-75 (s)",
-    "boost_time_boost_75_100": "Time boost 75-100 (s)",
-    "boost_percent_boost_0_25": "Time boost 0-25 (%)",
-    "boost_percent_boost_25_50": "Time boost 25-50 (%)",
-    "boost_percent_boost_50_75": "Time boost 50-75 (%)",
-    "boost_percent_boost_75_100": "Time boost 75-100 (%)",
-    "movement_avg_speed": "Avg speed",
-    "movement_total_distance": "Total distance",
-    "movement_time_supersonic_speed": "Time in supersonic (s)",
-    "movement_time_boost_speed": "Time using boost (s)",
-    "movement_time_slow_speed": "Time slow (s)",
-    "movement_time_ground": "Time on the ground (s)",
-    "movement_time_low_air": "Time low in the air (s)",
-    "movement_time_high_air": "Time high in the air (s)",
-    "movement_time_powerslide": "Time powersliding (s)",
-    "movement_count_powerslide": "Number of powerslides",
-    "movement_avg_powerslide_duration": "Average duration of powerslides (s)",
-    "movement_avg_speed_percentage": "Average speed (%)",
-    "movement_percent_slow_speed": "Time slow (%)",
-    "movement_percent_boost_speed": "Time boost (%)",
-    "movement_percent_supersonic_speed": "Time in supersonic (%)",
-    "movement_percent_ground": "Time on ground (%)",
-    "movement_percent_low_air": "Time low in the air (%)",
-    "movement_percent_high_air": "Time high in the air (%)",
-    "positioning_avg_distance_to_ball": "Avg distance to ball",
-    "positioning_avg_distance_to_ball_possession": "Avg distance to ball during possession",
-    "positioning_avg_distance_to_ball_no_possession": "Avg distance to ball without possession",
-    "positioning_avg_distance_to_mates": "Avg distance to mates",
-    "positioning_time_defensive_third": "Time defensive third (s)",
-    "positioning_time_neutral_third": "Time neutral third (s)",
-    "positioning_time_offensive_third": "Time offensive third (s)",
-    "positioning_time_defensive_half": "Time defensive half (s)",
-    "positioning_time_offensive_half": "Time offensive half (s)",
-    "positioning_time_behind_ball": "Time behind ball (s)",
-    "positioning_time_infront_ball": "Time in front ball (s)",
-    "positioning_time_most_back": "Time last player (s)",
-    "positioning_time_most_forward": "Time first player (s)",
-    "positioning_time_closest_to_ball": "Time closest to ball (s)",
-    "positioning_time_farthest_from_ball": "Time farthest to ball (s)",
-    "positioning_percent_defensive_third": "Time defensive third (%)",
-    "positioning_percent_neutral_third": "Time neutral third (%)",
-    "positioning_percent_offensive_third": "Time offensive third (%)",
-    "positioning_percent_defensive_half": "Time defensive half (%)",
-    "positioning_percent_offensive_half": "Time offensive half (%)",
-    "positioning_percent_behind_ball": "Time behind ball (%)",
-    "positioning_percent_infront_ball": "Time in front ball (%)",
-    "positioning_percent_most_back": "Time last player (%)",
-    "positioning_percent_most_forward": "Time first player (%)",
-    "positioning_percent_closest_to_ball": "Time closest to ball (%)",
-    "positioning_percent_farthest_from_ball": "Time farthest to ball (%)",
-    "demo_inflicted": "Demolishes",
-    "demo_taken": "Demolishes taken",
-    # "positioning_goals_against_while_last_defender": "Goals taken when last defender", # Bugged column
-    "gamelength": "Game length (s)",
-    "gamewin": "Result",
-    "gamemode": "Game mode",
+# Tracked players are referred to by their position: columns of the roster
+# index, groups of the summary cube and form, names are looked up from it
+tracked_ids = pd.Index(list(tracked_players), dtype=object)
+tracked_names = np.array(list(tracked_players.values()), dtype=object)
+# Above this number of tracked players, players are included and excluded with
+# two searchable multi-selects instead of one radio group per player
+large_roster_players = int(os.environ.get("SAMUTRACKER_LARGE_ROSTER", 20))
+# Compact dtypes of the history (compact_history): text columns are kept as
+# integer codes of their categories and the time stamp as datetime64. Integer
+# counts are stored as int16 when they fit (-32768 to 32767, int32 otherwise),
+# other numbers as float32 (7 significant digits, stats have 2 decimals at most)
+categorical_columns = [c for c in text_variables if c != "timestamp"]
+raw_data_path = Path(os.environ.get("SAMUTRACKER_DATA", app_dir / "data"))
+history_poll_secs = 2
+# The history is split in shards: the pickle, CSV and Parquet files of the data
+# folder, read by load_workers threads. Each shard is derived and cached in
+# its own store (data folder / "shards"), the merged history in "store"
+shard_suffixes = [".pkl", ".csv", ".parquet"]
+# Raw columns every shard must have, the games and teams are derived from them
+shard_columns = ["timestamp", "id", "player", "team", "core_goals"]
+# Errors of a shard that cannot be read yet (being written) or is invalid
+shard_errors = (
+    OSError,
+    EOFError,
+    pickle.UnpicklingError,
+    pd.errors.ParserError,
+    pd.errors.EmptyDataError,
+    ValueError,
+)
+load_workers = int(os.environ.get("SAMUTRACKER_LOAD_WORKERS", os.cpu_count() or 1))
+# Workers only attach to the store published by src.loader, they never read
+# the shards themselves (several app workers share one copy of the history)
+attach_store = os.environ.get("SAMUTRACKER_ATTACH", "0") == "1"
+view_cache_entries = 64
+view_cache_bytes = 256 * 2**20
+# Rendered scoreboards of hovered games, and number of the most recent filtered
+# games rendered in the background when the filters change (0 to disable)
+scoreboard_cache_entries = 512
+prerender_games = int(os.environ.get("SAMUTRACKER_PRERENDER_GAMES", 0))
+# Figures switch to WebGL and a sample of the points above this number of rows
+large_plot_rows = int(os.environ.get("SAMUTRACKER_LARGE_PLOT_ROWS", 5000))
+plot_sample_rows = 2000
+# Changes of the n_games slider are passed on once it has been still for
+# slider_debounce_secs, hovered games at most every hover_throttle_secs
+slider_debounce_secs = 0.2
+hover_throttle_secs = 0.1
+# Opt-in profiling of the reactive calcs, renderers and hover callbacks, shown
+# in a performance panel and optionally logged as JSON lines
+profile_app = os.environ.get("SAMUTRACKER_PROFILE", "0") == "1"
+profile_log = os.environ.get("SAMUTRACKER_PROFILE_LOG")
+# Rolling means over form_window games, exponentially weighted means with a
+# half-life of form_halflife games, streaks beyond form_threshold standard errors
+form_window = 10
+form_halflife = 5
+form_threshold = 2.5
+# Variables ranked among all the games of their mode in the scoreboard of a
+# hovered game, by label
+percentile_stats = {
+    "score": "core_score",
+    "goals": "core_goals",
+    "saves": "core_saves",
+    "boost": "boost_bcpm",
+    "positioning": "positioning_percent_behind_ball",
+}
+summary_stats = {
+    "Goals": "core_goals",
+    "Assists": "core_assists",
+    "Saves": "core_saves",
+    "Shots": "core_shots",
+    "Demolishes": "demo_inflicted",
 }
 
 
 # Read all matches
-def read_history(data_path):
+def read_history(data_path, columns=None):
     """
     Read all match history and parse it in a readable way for the app
 
-    :param data_path: Folder where the exported .csv from Bakkesmod are stored
+    The shards of data_path are read concurrently, each one from its own store
+    unless it changed, then merged without the rows of a (time stamp, Account
+    ID) already read. The merged history is kept in a columnar store
+    (data_path / "store"), it is merged again only when a shard changes.
+
+    :param data_path: Folder of the shards generated by SamuParser
+    :param columns: Columns to read (keys of variables_dictionary_all), all if None
+    """
+    store_path = data_path / "store"
+    projection = list(variables_dictionary_all)
+    shards = shard_signatures(data_path)
+    if not shards:
+        raise FileNotFoundError(f"No match history in {data_path}")
+    meta = read_meta(store_path) or {}
+    if meta.get("projection") != projection or meta.get("shards") != shards:
+        with ThreadPoolExecutor(max_workers=load_workers) as pool:
+            match_history = merge_shards(
+                pool.map(lambda name: read_shard(data_path, name), shards)
+            )
+        try:
+            write_store(match_history, store_path, projection=projection, shards=shards)
+        except OSError:
+            # Read-only data folder, keep the merged history in memory
+            if columns is not None:
+                match_history = match_history[
+                    [c for c in columns if c in match_history.columns]
+                ]
+            return match_history.rename(columns=variables_dictionary_all)
+
+    match_history = read_store(store_path, columns, categorical=categorical_columns)
+    return match_history.rename(columns=variables_dictionary_all)
+
+
+def history_shards(data_path):
+    """
+    Shards of the match history: pickle, CSV and Parquet files of a folder,
+    sorted by name
+
+    :param data_path: Folder of the shards
+    """
+    return sorted(
+        Path(path)
+        for suffix in shard_suffixes
+        for path in glob.glob(str(data_path / f"*{suffix}"))
+    )
+
+
+def shard_signatures(data_path):
+    """
+    Size and modification time of each shard, by file name
+
+    :param data_path: Folder of the shards
+    """
+    signatures = {}
+    for shard in history_shards(data_path):
+        try:
+            signatures[shard.name] = source_signature(shard)
+        except OSError:
+            pass  # Removed since listed
+    return signatures
+
+
+def read_shard(data_path, name):
+    """
+    Derived history of one shard, from its store (data_path / "shards" / name)
+    which is rebuilt only when the shard changes
+
+    :param data_path: Folder of the shards
+    :param name: File name of the shard
+    """
+    source = data_path / name
+    cache_path = data_path / "shards" / name
+    projection = list(variables_dictionary_all)
+    if store_is_current(cache_path, source, projection):
+        try:
+            return read_store(cache_path, categorical=categorical_columns)
+        except OSError:
+            pass  # Being rebuilt by another process, derived again
+    shard = import_history(source)
+    try:
+        write_store(shard, cache_path, source, projection)
+    except OSError:
+        pass  # Read-only data folder
+    return shard
+
+
+def merge_shards(shards):
+    """
+    Merge derived shards in one history sorted by time stamp, the rows of a
+    (time stamp, Account ID) of an earlier shard are kept
+
+    :param shards: Derived histories, from import_history
+    """
+    match_history = compact_history(pd.concat(list(shards), ignore_index=True))
+    keys = row_keys(match_history["timestamp"], match_history["id"])
+    match_history = match_history[~pd.Series(keys).duplicated().to_numpy()]
+    return match_history.sort_values("timestamp", kind="stable", ignore_index=True)
+
+
+def row_keys(timestamps, ids):
+    """
+    64-bit hash of the time stamp and Account ID of each row, the key rows are
+    deduplicated by
+
+    Categorical Account IDs are hashed once per category.
+
+    :param timestamps: Time stamp of each row, as datetime64
+    :param ids: Account ID of each row
+    """
+    return pd.util.hash_pandas_object(
+        pd.DataFrame({"timestamp": timestamps, "id": ids}, copy=False), index=False
+    ).to_numpy()
+
+
+def read_shard_file(source):
+    """
+    Raw rows of a shard, read according to its file type
+
+    Raises a ValueError when a column of shard_columns is missing.
+
+    :param source: Path of a pickle, CSV or Parquet file
+    """
+    if source.suffix == ".csv":
+        raw_history = pd.read_csv(source)
+    elif source.suffix == ".parquet":
+        raw_history = pd.read_parquet(source)
+    else:
+        raw_history = pd.read_pickle(source)
+    missing = [c for c in shard_columns if c not in raw_history.columns]
+    if missing:
+        raise ValueError(f"Shard {source.name} has no column {', '.join(missing)}")
+    return raw_history
+
+
+def import_history(source):
+    """
+    Import a shard generated by SamuParser and derive the app columns
+
+    Only the columns listed in variables_dictionary_all are kept.
+
+    :param source: Path of a pickle, CSV or Parquet file
+    """
+    return prepare_history(read_shard_file(source))
+
+
+def prepare_history(match_history):
+    """
+    Derive the app columns from raw SamuParser rows and keep only the columns
+    listed in variables_dictionary_all
+
+    :param match_history: Raw rows from SamuParser, one row per player and game
     """
-    all_matches = data_path / "main.pkl"
-    match_history = pd.read_pickle(all_matches)
     match_history = match_history.drop(
-        "positioning_goals_against_while_last_defender", axis=1
+        "positioning_goals_against_while_last_defender", axis=1, errors="ignore"
     )  # Bugged column
-
-    # Add date and time
-    match_history[["date", "time"]] = match_history["timestamp"].str.split(
-        "T", expand=True
+    match_history = derive_history(match_history)
+    # Stored in game order, game_index then has nothing to sort
+    match_history = match_history.sort_values(
+        "timestamp", kind="stable", ignore_index=True
     )
+    return compact_history(
+        match_history[
+            [c for c in match_history.columns if c in variables_dictionary_all]
+        ]
+    )
+
+
+def compact_history(match_history):
+    """
+    Store the columns of a history with their compact dtypes (see
+    categorical_columns), columns that already have them are kept as they are
+
+    :param match_history: History with the SamuParser column names
+    """
+    columns = {}
+    for name, values in match_history.items():
+        if name in categorical_columns:
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                columns[name] = values.astype("category")
+        elif name == "timestamp":
+            if not pd.api.types.is_datetime64_dtype(values):
+                # Parsed once per game
+                values = values.astype("category")
+                columns[name] = values.cat.rename_categories(
+                    pd.to_datetime(values.cat.categories, format="ISO8601")
+                ).astype("datetime64[ns]")
+        elif pd.api.types.is_integer_dtype(values):
+            low, high = (values.min(), values.max()) if len(values) else (0, 0)
+            for dtype in [np.int16, np.int32]:
+                if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                    if values.dtype != dtype:
+                        columns[name] = values.astype(dtype)
+                    break
+        elif pd.api.types.is_float_dtype(values) and values.dtype != np.float32:
+            columns[name] = values.astype(np.float32)
+    return match_history.assign(**columns)
+
+
+def memory_report(match_history):
+    """
+    Memory of a history in MB per compact dtype, with the dtypes it had before
+    compact_history (int64, float64 and Python strings) and with the compact ones
+
+    :param match_history: History from game_index
+    """
+    rows = []
+    for name, values in match_history.items():
+        before = 8 * len(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # One string object per row
+            counts = np.bincount(
+                values.cat.codes[values.cat.codes >= 0],
+                minlength=len(values.cat.categories),
+            )
+            sizes = [sys.getsizeof(str(c)) for c in values.cat.categories]
+            before += int(counts @ np.asarray(sizes, dtype=int))
+        elif pd.api.types.is_datetime64_dtype(values):
+            before += len(values) * sys.getsizeof("2024-01-01T00:00:00")
+        rows.append(
+            {
+                "Type": str(values.dtype),
+                "Columns": 1,
+                "Before (MB)": before / 2**20,
+                "After (MB)": values.memory_usage(deep=True, index=False) / 2**20,
+            }
+        )
+    report = pd.DataFrame(rows).groupby("Type", as_index=False).sum()
+    report.loc[len(report)] = ["Total", *report.iloc[:, 1:].sum()]
+    return report.astype({"Columns": int})
+
+
+def derive_history(match_history):
+    """
+    Add date, time, game mode and game result to raw match rows
+
+    Each value is computed once per game and broadcast to the rows of the game.
 
+    :param match_history: Raw rows from SamuParser, one row per player and game
+    """
     # Deduplicate in case the same game is added twice
-    match_history = match_history.drop_duplicates()
+    match_history = match_history.drop_duplicates(subset=["timestamp", "id"])
+    match_history = match_history.reset_index(drop=True)
+    game, games = pd.factorize(match_history["timestamp"])
+
+    # Add date and time
+    date_time = pd.Series(games).str.split("T", expand=True)
+    match_history["date"] = date_time[0].to_numpy()[game]
+    match_history["time"] = date_time[1].to_numpy()[game]
 
     # Add game mode
-    game_mode = match_history["timestamp"].value_counts().reset_index()
-    game_mode.columns = ["timestamp", "n_players"]
-    game_mode["gamemode"] = game_mode["n_players"].apply(
-        lambda x: f"{int(x/2)}v{int(x/2)}"
-    )
-    game_mode = game_mode.drop(columns=["n_players"])
-    match_history = pd.merge(match_history, game_mode, on="timestamp", how="left")
-
-    # Compute win/loose
-    win_df = (
-        match_history.pivot_table(
-            index="timestamp", columns="team", values="core_goals", aggfunc="sum"
+    half_players = pd.Series(np.bincount(game) // 2).astype(str)
+    match_history["gamemode"] = (half_players + "v" + half_players).to_numpy()[game]
+
+    # Compute win/loose, a team missing from a game never wins it
+    team = match_history["team"].to_numpy()
+    goals = match_history["core_goals"].fillna(0).to_numpy()
+    team_goals = {}
+    for color in ["blue", "orange"]:
+        in_team = team == color
+        team_goals[color] = np.where(
+            np.bincount(game, weights=in_team, minlength=len(games)) > 0,
+            np.bincount(game, weights=goals * in_team, minlength=len(games)),
+            np.nan,
         )
-        .reset_index()
-        .rename_axis(None, axis=1)
-    )
-    win_df["winner"] = np.where(
-        win_df["blue"] > win_df["orange"],
-        "blue",
-        np.where(win_df["orange"] > win_df["blue"], "orange", "draw"),
+    winner = np.select(
+        [
+            team_goals["blue"] > team_goals["orange"],
+            team_goals["orange"] > team_goals["blue"],
+        ],
+        ["blue", "orange"],
+        "draw",
     )
-    win_df = win_df[["timestamp", "winner"]]
-    match_history = pd.merge(match_history, win_df, on="timestamp", how="left")
-    match_history["gamewin"] = np.where(
-        match_history["winner"] == match_history["team"], "win", "loss"
-    )
-    match_history = match_history.drop(columns=["winner"])
-    match_history.rename(columns=variables_dictionary_all, inplace=True)
+    match_history["gamewin"] = np.where(winner[game] == team, "win", "loss")
 
     return match_history
 
@@ -170,10 +404,761 @@ def participation_dict(match_history):
     """
     timestamp = variables_dictionary_all["timestamp"]
     id = variables_dictionary_all["id"]
-    match_dict = match_history.groupby(timestamp)[id].apply(list).to_dict()
-    return match_dict
+    game, timestamps = pd.factorize(match_history[timestamp], sort=True)
+    order = np.argsort(game, kind="stable")
+    ids = np.asarray(match_history[id], dtype=object)[order]
+    starts = np.searchsorted(game[order], np.arange(1, len(timestamps)))
+    return dict(zip(timestamps, map(list, np.split(ids, starts))))
+
+
+def game_index(match_history):
+    """
+    Order the match history by game and build the games table
+
+    Returns the history sorted by game time stamp with an integer "Game" column,
+    and the games table: one row per game sorted by time stamp, with its mode,
+    winner, length and the rows of its players in the history (first_row,
+    n_rows). The game id is the row of the game in the games table, the roster
+    index and the summary cube.
+
+    :param match_history: Match history, one row per player and game
+    """
+    game, timestamps = pd.factorize(
+        match_history[variables_dictionary_all["timestamp"]], sort=True
+    )
+    if np.any(game[1:] < game[:-1]):
+        order = np.argsort(game, kind="stable")
+        match_history = match_history.take(order).reset_index(drop=True)
+        game = game[order]
+    match_history = match_history.assign(Game=game)
+
+    first_row = np.searchsorted(game, np.arange(len(timestamps)))
+    team = match_history[variables_dictionary_all["team"]].to_numpy()
+    won = (match_history[variables_dictionary_all["gamewin"]] == "win").to_numpy()
+    winner = np.full(len(timestamps), "draw", dtype=object)
+    winner[game[won]] = team[won]
+    games = pd.DataFrame(
+        {
+            "timestamp": np.asarray(timestamps),
+            "mode": match_history[variables_dictionary_all["gamemode"]].to_numpy()[
+                first_row
+            ],
+            "winner": winner,
+            "length": match_history[variables_dictionary_all["gamelength"]].to_numpy()[
+                first_row
+            ],
+            "first_row": first_row,
+            "n_rows": np.diff(np.r_[first_row, len(game)]),
+        }
+    )
+    return match_history, games
+
+
+def tracked_roster(match_history):
+    """
+    Build the roster index of the tracked players used to filter games, its
+    rows are the game ids of game_index
+
+    :param match_history: Match history from game_index, one row per player and
+        game
+    """
+    return roster_index(
+        match_history["Game"],
+        match_history[variables_dictionary_all["id"]],
+        match_history[variables_dictionary_all["team"]],
+        tracked_ids,
+    )
+
+
+def tracked_positions(match_history):
+    """
+    Position of the player of each row in the tracked players, -1 for the other
+    players
+
+    :param match_history: Match history from game_index
+    """
+    return player_positions(match_history[variables_dictionary_all["id"]], tracked_ids)
+
+
+def cached_view(function):
+    """
+    Decorator caching the views of the history in view_cache for all the
+    sessions, keyed by the function name, all its arguments and the version of
+    the history
+
+    The function takes the snapshot of the history as first argument, the
+    decorated function takes the other ones. history_snapshot is read once,
+    the key and the view then come from the same version even when a new one
+    is published meanwhile. Views calling views pass their snapshot=.
+    List arguments (player selections) are keyed as tuples.
+
+    :param function: Function computing a view from a snapshot
+    """
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def cached(*args, snapshot=None, **kwargs):
+        snapshot = snapshot or history_snapshot
+        arguments = signature.bind(snapshot, *args, **kwargs)
+        arguments.apply_defaults()
+        key = (
+            function.__name__,
+            *(
+                tuple(value) if isinstance(value, (list, tuple, np.ndarray)) else value
+                for name, value in arguments.arguments.items()
+                if name != "snapshot"
+            ),
+            snapshot["version"],
+        )
+        return view_cache.get(key, lambda: function(snapshot, *args, **kwargs))
+
+    return cached
+
+
+def last_game_ids(game_ids, n_games):
+    """
+    Ids of the n_games most recent games of a selection, none if n_games is 0
+
+    :param game_ids: Ids of the selected games, in time order
+    :param n_games: Number of games to keep
+    """
+    return game_ids[-n_games:] if n_games > 0 else game_ids[:0]
+
+
+@cached_view
+def filter_games(
+    snapshot, mode, include=(), exclude=(), min_included=None, teams="any"
+):
+    """
+    Ids of the games of a mode with tracked players matching a player selection,
+    in time order
+
+    Views are cached in view_cache for all sessions, see select_games for the
+    selection parameters.
+
+    :param mode: Game mode ("3v3", "2v2" or "1v1")
+    """
+    roster = snapshot["roster"]
+    game_ids = select_games(roster, include, exclude, min_included, teams)
+    in_mode = snapshot["games"]["mode"].to_numpy()[game_ids] == mode
+    with_tracked = roster["present"][game_ids].any(axis=1)
+    return game_ids[in_mode & with_tracked]
+
+
+@cached_view
+def filter_history(
+    snapshot, mode, include=(), exclude=(), min_included=None, teams="any"
+):
+    """
+    Rows of the tracked players in the games of filter_games, ordered by game
+
+    :param mode: Game mode, see filter_games for the other parameters
+    """
+    match_history = snapshot["match_history"]
+    selected = np.zeros(len(snapshot["games"]), dtype=bool)
+    selected[
+        filter_games(mode, include, exclude, min_included, teams, snapshot=snapshot)
+    ] = True
+    player = tracked_positions(match_history)
+    rows = selected[match_history["Game"].to_numpy()] & (player >= 0)
+    return match_history[rows].assign(FixedName=tracked_names[player[rows]])
+
+
+@cached_view
+def last_games(
+    snapshot, n_games, mode, include=(), exclude=(), min_included=None, teams="any"
+):
+    """
+    Rows of the n most recent games of a filtered history, cached in view_cache
+
+    :param n_games: Number of games to keep
+    :param mode: Game mode, see filter_games for the other parameters
+    """
+    filt_mh = filter_history(
+        mode, include, exclude, min_included, teams, snapshot=snapshot
+    )
+    game_ids = filter_games(
+        mode, include, exclude, min_included, teams, snapshot=snapshot
+    )
+    selected = last_game_ids(game_ids, n_games)
+    if len(selected) == 0:
+        return filt_mh.iloc[:0]
+    # Rows are ordered by game, the last games are a suffix
+    return filt_mh.iloc[np.searchsorted(filt_mh["Game"].to_numpy(), selected[0]) :]
+
+
+def summary_cube(match_history):
+    """
+    Cube of the tracked players rows with one group per game mode and player,
+    rows ordered by game id
+
+    :param match_history: Match history from game_index, one row per player and
+        game
+    """
+    player = tracked_positions(match_history)
+    tracked = match_history[player >= 0]
+    frame = pd.DataFrame(
+        {
+            "mode": tracked[variables_dictionary_all["gamemode"]].to_numpy(),
+            "player": player[player >= 0],
+            "game": tracked["Game"].to_numpy(),
+            "Games": 1,
+            **{
+                k: tracked[variables_dictionary_all[v]].to_numpy()
+                for k, v in summary_stats.items()
+            },
+            "Wins": (tracked[variables_dictionary_all["gamewin"]] == "win").to_numpy(),
+        }
+    )
+    return build_cube(frame, keys=["mode", "player"], order="game")
+
+
+def player_form(match_history, form=None):
+    """
+    Rolling and exponentially weighted means of all the numeric variables, and
+    their hot streaks and slumps, for each tracked player and game mode
+
+    Rows are ordered by game id, a form is extended with the rows of games
+    after its last games only.
+
+    :param match_history: Rows to add, from game_index
+    :param form: Form to extend, a new one if None
+    """
+    if form is None:
+        form = empty_form(
+            ["mode", "player"],
+            numeric_variables,
+            form_window,
+            form_halflife,
+            form_threshold,
+        )
+    player = tracked_positions(match_history)
+    tracked = match_history[player >= 0]
+    frame = pd.DataFrame(
+        {
+            "mode": tracked[variables_dictionary_all["gamemode"]].to_numpy(),
+            "player": player[player >= 0],
+            "order": tracked["Game"].to_numpy(),
+        }
+    )
+    frame[numeric_variables] = tracked[numeric_variables].to_numpy(dtype=float)
+    return extend_form(form, frame)
+
+
+def stat_percentiles(match_history, percentiles=None):
+    """
+    Sorted values of the percentile_stats variables of all the players for
+    each game mode, to rank the players of a hovered game
+
+    :param match_history: Rows to add, from game_index
+    :param percentiles: Rank tables to extend, new ones if None
+    """
+    return extend_rank_tables(
+        percentiles or {},
+        match_history,
+        variables_dictionary_all["gamemode"],
+        [variables_dictionary_all[v] for v in percentile_stats.values()],
+    )
+
+
+@cached_view
+def form_view(
+    snapshot,
+    stat,
+    n_games,
+    mode,
+    include=(),
+    exclude=(),
+    min_included=None,
+    teams="any",
+):
+    """
+    Rolling mean, exponentially weighted mean and streak flag of a variable for
+    each tracked player over the games of last_games, cached in view_cache
+
+    The means run over all the games of the player in the mode, the filters
+    only select the games shown.
+
+    :param stat: Numeric variable
+    :param n_games: Number of games, see filter_history for the other parameters
+    """
+    game_ids = filter_games(
+        mode, include, exclude, min_included, teams, snapshot=snapshot
+    )
+    game_ids = last_game_ids(game_ids, n_games)
+    form, games = snapshot["form"], snapshot["games"]
+    groups = form["groups"]
+    in_mode = (groups["mode"] == mode).to_numpy()[form["group"]]
+    rows = np.flatnonzero(in_mode & np.isin(form["order"], game_ids))
+    j = form["columns"].index(stat)
+    names = tracked_names[groups["player"].to_numpy()]
+    view = pd.DataFrame(
+        {
+            "FixedName": names[form["group"][rows]],
+            "Game": form["order"][rows],
+            variables_dictionary_all["timestamp"]: games["timestamp"].to_numpy()[
+                form["order"][rows]
+            ],
+            "Rolling": form["rolling"][j, rows],
+            "EWM": form["ewm"][j, rows],
+            "Flag": form["flag"][j, rows],
+        }
+    )
+    return view.sort_values(["FixedName", "Game"], ignore_index=True)
+
+
+@cached_view
+def pair_winrates(
+    snapshot,
+    relation,
+    n_games,
+    mode,
+    include=(),
+    exclude=(),
+    min_included=None,
+    teams="any",
+):
+    """
+    Games, wins, winrate and its 95% confidence interval of every pair of
+    tracked players over the games of last_games, cached in view_cache
+
+    One row per pair of the players of these games (Player, Partner), in
+    matrix order with the players sorted by name.
+
+    :param relation: "together" (same team) or "against" (opposing teams)
+    :param n_games: Number of games, see filter_history for the other parameters
+    """
+    game_ids = filter_games(
+        mode, include, exclude, min_included, teams, snapshot=snapshot
+    )
+    game_ids = last_game_ids(game_ids, n_games)
+    records = pair_records(
+        snapshot["roster"], game_ids, snapshot["games"]["winner"].to_numpy()
+    )
+    # Players of the games, the diagonal of together is their number of games
+    players = np.flatnonzero(records["together"][0].diagonal() > 0)
+    players = players[np.argsort(tracked_names[players], kind="stable")]
+    n, wins = (m[np.ix_(players, players)] for m in records[relation])
+    low, high = wilson_interval(wins, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        winrate = wins / n
+    names = tracked_names[players]
+    return pd.DataFrame(
+        {
+            "Player": np.repeat(names, len(names)),
+            "Partner": np.tile(names, len(names)),
+            "Games": n.ravel().astype(int),
+            "Wins": wins.ravel().astype(int),
+            "Winrate": winrate.ravel() * 100,
+            "Low": low.ravel() * 100,
+            "High": high.ravel() * 100,
+        }
+    )
+
+
+@cached_view
+def summary_totals(
+    snapshot, n_games, mode, include=(), exclude=(), min_included=None, teams="any"
+):
+    """
+    Games, summed core stats, wins and winrate of each tracked player over the
+    games of last_games, computed from summary_cube
+
+    Without included or excluded players the last games of a mode are a suffix
+    of each player's rows, totals are then differences of cumulative sums.
+
+    :param n_games: Number of games, see filter_history for the other parameters
+    """
+    cube = snapshot["cube"]
+    groups = np.flatnonzero(cube["groups"]["mode"] == mode)
+    game_ids = filter_games(
+        mode, include, exclude, min_included, teams, snapshot=snapshot
+    )
+    if not include and not exclude:
+        since = game_ids[-n_games] if 0 < n_games < len(game_ids) else 0
+        totals = cube_totals_since(cube, groups, since)
+    else:
+        selected = last_game_ids(game_ids, n_games)
+        totals = cube_totals_masked(cube, groups, np.isin(cube["order"], selected))
+
+    player = cube["groups"]["player"].to_numpy()[groups]
+    totals.insert(0, "Account ID", tracked_ids[player])
+    totals.insert(1, "FixedName", tracked_names[player])
+    totals = totals[totals["Games"] > 0].sort_values("Account ID")
+    totals[["Games", "Wins", *summary_stats]] = totals[
+        ["Games", "Wins", *summary_stats]
+    ].astype(int)
+    totals["Winrate"] = round(totals["Wins"] / totals["Games"] * 100, 2)
+    return totals.reset_index(drop=True)
+
+
+@cached_view
+def correlations(
+    snapshot,
+    method,
+    n_games,
+    mode,
+    include=(),
+    exclude=(),
+    min_included=None,
+    teams="any",
+):
+    """
+    Correlations between all the numeric variables over the games of last_games,
+    cached in view_cache
+
+    :param method: "pearson" or "spearman"
+    :param n_games: Number of games, see filter_history for the other parameters
+    """
+    filt_mh = last_games(
+        n_games, mode, include, exclude, min_included, teams, snapshot=snapshot
+    )
+    return correlation_matrix(filt_mh[numeric_variables], method)
+
+
+def scoreboard(timestamp):
+    """
+    HTML scoreboard of a game, cached in scoreboard_cache for all sessions
+
+    :param timestamp: Time stamp of the game, an empty table if None
+    """
+    snapshot = history_snapshot
+    return scoreboard_cache.get(
+        (timestamp, snapshot["version"]),
+        lambda: game_scoreboard(
+            snapshot["match_history"],
+            snapshot["games"],
+            timestamp,
+            snapshot["percentiles"],
+            {k: variables_dictionary_all[v] for k, v in percentile_stats.items()},
+        ),
+    )
+
+
+def prerender_scoreboards(game_ids):
+    """
+    Render the scoreboards of the prerender_games most recent games of a
+    selection in a background thread, so that hovering them hits the cache
+
+    A new selection stops the rendering of the previous one.
+
+    :param game_ids: Ids of the selected games, in time order
+    """
+    global prerender_generation
+
+    if prerender_games <= 0:
+        return
+    with prerender_lock:
+        prerender_generation += 1
+        generation = prerender_generation
+    games = history_snapshot["games"]
+    timestamps = games["timestamp"].to_numpy()[game_ids[-prerender_games:]]
+
+    def render():
+        # Most recent first, they are hovered first
+        for timestamp in timestamps[::-1]:
+            if prerender_generation != generation:
+                return
+            scoreboard(timestamp)
+
+    threading.Thread(target=render, daemon=True).start()
+
+
+def ingest_new_games(data_path):
+    """
+    Append the games of the shards added or changed since the history was
+    loaded
+
+    Only the rows of these shards that are not in the history yet go through
+    the derivation steps, a new history snapshot is published when games were
+    added. Removed shards are only dropped at the next start.
+
+    :param data_path: Folder of the shards generated by SamuParser
+    """
+    global history_signature
+
+    with ingest_lock:
+        shards = shard_signatures(data_path)
+        if shards == history_signature:
+            return history_snapshot["version"]
+        changed = [
+            data_path / name
+            for name, signature in shards.items()
+            if (history_signature or {}).get(name) != signature
+        ]
+        new_games = read_new_games(changed)
+        history_signature = shards
+        if new_games.empty:
+            return history_snapshot["version"]
+        raw_names = {v: k for k, v in variables_dictionary_all.items()}
+        # Categories of the two histories differ, they are merged again
+        updated_history = compact_history(
+            pd.concat(
+                [
+                    history_snapshot["match_history"]
+                    .drop(columns="Game")
+                    .rename(columns=raw_names),
+                    new_games,
+                ],
+                ignore_index=True,
+            )
+        )
+        if not updated_history["timestamp"].is_monotonic_increasing:
+            updated_history = updated_history.sort_values(
+                "timestamp", kind="stable", ignore_index=True
+            )
+        store_path = data_path / "store"
+        try:
+            write_store(
+                updated_history,
+                store_path,
+                projection=list(variables_dictionary_all),
+                shards=shards,
+            )
+            updated_history = read_store(store_path, categorical=categorical_columns)
+        except OSError:
+            pass  # Read-only data folder, keep the updated history in memory
+
+        return publish_indices(
+            build_indices(
+                updated_history.rename(columns=variables_dictionary_all),
+                new_games.rename(columns=variables_dictionary_all),
+            )
+        )
+
+
+def build_indices(history, new_games=None):
+    """
+    Games table, participations, roster, summary cube, form and rank tables of
+    a history, to be published by publish_indices
+
+    With new_games, the rows of history that are not in the published history
+    yet, the participations and rank tables are extended with them, and so is
+    the form when they are after the known games.
+
+    :param history: History with the app column names
+    :param new_games: Rows added to match_history, None to build everything
+    """
+    indexed, game_table = game_index(history)
+    indices = {
+        "match_history": indexed,
+        "games": game_table,
+        "roster": tracked_roster(indexed),
+        "cube": summary_cube(indexed),
+    }
+    if new_games is None:
+        indices["participation_dictionary"] = participation_dict(indexed)
+        indices["form"] = player_form(indexed)
+        indices["percentiles"] = stat_percentiles(indexed)
+        return indices
+
+    known = history_snapshot
+    indices["participation_dictionary"] = {
+        **known["participation_dictionary"],
+        **participation_dict(new_games),
+    }
+    indices["percentiles"] = stat_percentiles(new_games, known["percentiles"])
+    # Games after the known ones extend the form, older ones rebuild it
+    games = known["games"]
+    n_known = len(games)
+    if (
+        n_known
+        and new_games[variables_dictionary_all["timestamp"]].min()
+        > games["timestamp"].iloc[-1]
+    ):
+        new_rows = indexed.iloc[game_table["first_row"].iloc[n_known] :]
+        indices["form"] = player_form(new_rows, known["form"])
+    else:
+        indices["form"] = player_form(indexed)
+    return indices
+
+
+def publish_indices(indices):
+    """
+    Publish the history and indices built by build_indices as a new
+    history_snapshot, with the next version so that cached views are computed
+    again
+
+    The snapshot is replaced in one assignment and never changed, readers
+    holding the previous one keep a consistent history.
+
+    :param indices: Dictionary from build_indices
+    """
+    global history_snapshot
+
+    history_snapshot = {**indices, "version": history_snapshot["version"] + 1}
+    return history_snapshot["version"]
+
+
+def read_new_games(sources):
+    """
+    Derived rows of shards that are not in the history yet, rows repeated in
+    the shards are kept once
+
+    A shard that cannot be read (being written, or invalid) is logged and
+    skipped, it is read again once it changes.
+
+    :param sources: Paths of the shards
+    """
+    with ThreadPoolExecutor(max_workers=load_workers) as pool:
+        shards = [s for s in pool.map(read_new_shard, sources) if s is not None]
+    if not shards:
+        return pd.DataFrame()
+    raw_history = pd.concat(shards, ignore_index=True)
+
+    keys = compact_history(raw_history[["timestamp", "id"]])
+    keys = row_keys(keys["timestamp"], keys["id"])
+    match_history = history_snapshot["match_history"]
+    known = row_keys(
+        match_history[variables_dictionary_all["timestamp"]],
+        match_history[variables_dictionary_all["id"]],
+    )
+    new_games = raw_history[
+        ~np.isin(keys, known) & ~pd.Series(keys).duplicated().to_numpy()
+    ]
+    return prepare_history(new_games)
+
+
+def read_new_shard(source):
+    """
+    Raw rows of a changed shard, None when it cannot be read
+
+    :param source: Path of the shard
+    """
+    try:
+        return read_shard_file(source)
+    except shard_errors as e:
+        logger.warning("Shard %s skipped until it changes: %s", source.name, e)
+        return None
+
+
+def attach_new_version(data_path):
+    """
+    Reload the history when the store published by the loader has a new version
+
+    The indices are rebuilt and published, the numeric columns
+    stay memory-mapped so all the attached workers share them.
+
+    :param data_path: Folder where the store is published
+    """
+    global attached_version
+
+    store_path = data_path / "store"
+    with ingest_lock:
+        version = store_version(store_path)
+        if version is None or version == attached_version:
+            return history_snapshot["version"]
+        try:
+            updated_history = read_store(store_path, categorical=categorical_columns)
+        except OSError:
+            return history_snapshot["version"]  # Being replaced, next poll gets it
+
+        indices = build_indices(
+            updated_history.rename(columns=variables_dictionary_all)
+        )
+        attached_version = version
+        return publish_indices(indices)
+
+
+def refresh_history(data_path):
+    """
+    Bring the history up to date: append the new games of the shards, or reload
+    the store published by the loader when attached to it
+
+    :param data_path: Folder of the shards generated by SamuParser
+    """
+    if attach_store:
+        return attach_new_version(data_path)
+    return ingest_new_games(data_path)
+
+
+def history_stamp(data_path):
+    """
+    Value that changes when the history has to be refreshed: version of the
+    store when attached to it, signatures of the shards otherwise
+
+    :param data_path: Folder of the shards generated by SamuParser
+    """
+    if attach_store:
+        return store_version(data_path / "store")
+    return shard_signatures(data_path)
+
+
+def load_history(data_path, warm_modules=()):
+    """
+    Load the match history and build its indices, then set history_loaded
+
+    An error while loading is kept in load_error for the app to report it.
+    Attached workers wait for the store published by the loader instead.
+
+    :param data_path: Folder of the shards generated by SamuParser
+    :param warm_modules: Modules to import once the history is loaded, so
+        that the first render does not wait for them
+    """
+    global history_signature, load_error
+
+    if attach_store:
+        try:
+            # Wait for the loader to publish the store
+            attach_new_version(data_path)
+            while attached_version is None:
+                time.sleep(history_poll_secs)
+                attach_new_version(data_path)
+        except Exception as e:
+            load_error = e
+        finally:
+            history_loaded.set()
+        for module in warm_modules:
+            importlib.import_module(module)
+        return
+
+    with ingest_lock:
+        try:
+            history_signature = shard_signatures(data_path)
+            publish_indices(build_indices(read_history(data_path)))
+        except Exception as e:
+            load_error = e
+        finally:
+            history_loaded.set()
+
+    for module in warm_modules:
+        importlib.import_module(module)
+
+
+def start_loading(data_path, warm_modules=()):
+    """
+    Load the match history in a background thread, only once per process
+
+    :param data_path: Folder of the shards generated by SamuParser
+    :param warm_modules: Modules to import once the history is loaded
+    """
+    global loader
+
+    with ingest_lock:
+        if loader is None:
+            loader = threading.Thread(
+                target=load_history, args=(data_path, warm_modules), daemon=True
+            )
+            loader.start()
 
 
-match_history = read_history(raw_data_path)
-participation_dictionary = participation_dict(match_history)
-numeric_variables = match_history.select_dtypes(include="number").columns.tolist()
+logger = logging.getLogger(__name__)
+ingest_lock = threading.Lock()
+view_cache = LRUCache(max_entries=view_cache_entries, max_bytes=view_cache_bytes)
+scoreboard_cache = LRUCache(max_entries=scoreboard_cache_entries)
+prerender_lock = threading.Lock()
+prerender_generation = 0
+profiler = Profiler(
+    enabled=profile_app or profile_log is not None, log_path=profile_log
+)
+# History and indices published by publish_indices (match_history, games,
+# participation_dictionary, roster, cube, form, percentiles and version)
+history_snapshot = {"version": 0}
+history_signature = None
+attached_version = None
+history_loaded = threading.Event()
+load_error = None
+loader = None
+numeric_variables = [
+    v for k, v in variables_dictionary_all.items() if k not in text_variables
+]
@@ -0,0 +1,243 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+store_format = 2
+meta_file = "meta.json"
+
+
+def write_store(df, store_path, source=None, projection=None, shards=None):
+    """
+    Write a data frame as a columnar store: one .npy file per column
+
+    Numeric and datetime columns are saved as-is so they can be memory-mapped
+    back. String columns are saved as integer codes, their categories are kept
+    in meta.json.
+
+    :param df: Data frame to store (column names are used as file names)
+    :param store_path: Folder of the store, replaced if it already exists
+    :param source: Optional file the data frame was built from, its size,
+        modification time and hash are recorded to detect a stale store
+    :param projection: Optional list of columns that were requested from
+        source, recorded to detect a store built for other columns
+    :param shards: Optional signatures of the files the data frame was merged
+        from, by file name
+    """
+    store_path = Path(store_path)
+    previous = read_meta(store_path)
+    tmp_path = store_path.with_name(f".{store_path.name}.tmp{os.getpid()}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    old_path = store_path.with_name(f".{store_path.name}.old{os.getpid()}")
+    try:
+        tmp_path.mkdir(parents=True)
+
+        columns = save_columns(df, tmp_path)
+
+        meta = {
+            "format": store_format,
+            # Increased at each write, processes attached to the store reload on change
+            "version": (previous or {}).get("version", 0) + 1,
+            "n_rows": len(df),
+            "columns": columns,
+            "source": (
+                {**source_signature(source), "hash": source_hash(source)}
+                if source is not None
+                else None
+            ),
+            "projection": list(projection) if projection is not None else None,
+            "shards": shards,
+        }
+        with open(tmp_path / meta_file, "w") as f:
+            json.dump(meta, f)
+
+        # Swap folders so readers never see a half written store
+        if store_path.exists():
+            store_path.rename(old_path)
+        try:
+            tmp_path.rename(store_path)
+        except OSError:
+            if old_path.exists() and not store_path.exists():
+                old_path.rename(store_path)  # Keep the previous store
+            raise
+        shutil.rmtree(old_path, ignore_errors=True)
+    finally:
+        # Left behind when writing or swapping failed
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def save_columns(df, path):
+    """
+    Save each column of a data frame as a .npy file, returns the kind of each
+    column (and the categories of the string columns) for the metadata
+
+    :param df: Data frame to save
+    :param path: Folder of the files
+    """
+    columns = {}
+    for name in df.columns:
+        values = df[name]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            np.save(path / f"{name}.npy", values.to_numpy())
+            columns[name] = {"kind": "numeric"}
+        elif pd.api.types.is_datetime64_dtype(values):
+            np.save(path / f"{name}.npy", values.to_numpy())
+            columns[name] = {"kind": "datetime"}
+        else:
+            codes, categories = pd.factorize(values)
+            np.save(path / f"{name}.npy", codes.astype(np.int32))
+            columns[name] = {"kind": "string", "categories": categories.tolist()}
+    return columns
+
+
+def read_meta(store_path):
+    """
+    Read the metadata of a store, None if there is no readable store
+
+    :param store_path: Folder of the store
+    """
+    try:
+        with open(Path(store_path) / meta_file, "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("format") != store_format:
+        return None
+    return meta
+
+
+def store_version(store_path):
+    """
+    Version of a store, increased each time it is written, None if there is no
+    readable store
+
+    :param store_path: Folder of the store
+    """
+    meta = read_meta(store_path)
+    return None if meta is None else meta.get("version", 0)
+
+
+def read_store(store_path, columns=None, attempts=3, categorical=()):
+    """
+    Read a columnar store, numeric columns are memory-mapped and only the
+    requested columns are touched
+
+    :param store_path: Folder of the store
+    :param columns: Columns to read, all columns if None. Columns missing from
+        the store are skipped
+    :param attempts: Number of reads when the store is replaced by another
+        process while it is read
+    :param categorical: String columns read as categoricals of their stored
+        codes instead of strings
+    """
+    store_path = Path(store_path)
+    for _ in range(attempts):
+        meta = read_meta(store_path)
+        if meta is None:
+            raise FileNotFoundError(f"No match store in {store_path}")
+        try:
+            df = read_columns(store_path, meta, columns, categorical)
+        except OSError:
+            continue
+        # Columns and categories must all come from the same version
+        if store_version(store_path) == meta.get("version", 0):
+            return df
+    raise FileNotFoundError(f"Match store in {store_path} kept changing while read")
+
+
+def read_columns(store_path, meta, columns=None, categorical=()):
+    """
+    Read the columns of a store described by its metadata
+
+    :param store_path: Folder of the store
+    :param meta: Metadata of the store, from read_meta
+    :param columns: Columns to read, all columns if None
+    :param categorical: String columns read as categoricals
+    """
+    if columns is None:
+        columns = list(meta["columns"])
+
+    data = {}
+    for name in columns:
+        column = meta["columns"].get(name)
+        if column is None:
+            continue
+        values = np.load(store_path / f"{name}.npy", mmap_mode="r")
+        if column["kind"] == "string" and name in categorical:
+            values = pd.Categorical.from_codes(values, column["categories"])
+        elif column["kind"] == "string":
+            # Missing values were factorized to -1, which picks the trailing None
+            categories = np.array(column["categories"] + [None], dtype=object)
+            values = pd.Series(categories[values], dtype="str")
+        data[name] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def source_signature(source):
+    """
+    Size and modification time of a source file, used to detect a stale store
+
+    :param source: Path of the source file
+    """
+    stat = Path(source).stat()
+    return {"name": Path(source).name, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def source_hash(source):
+    """
+    Hash of the content of a source file
+
+    :param source: Path of the source file
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(source, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_is_current(store_path, source, projection=None):
+    """
+    Check if a store exists and was built from the current version of source
+    for the same projection
+
+    A source with a new modification time but the same content (copied or
+    deployed again) is detected by its hash, the store is then kept.
+
+    :param store_path: Folder of the store
+    :param source: Source file of the store, ignored if it does not exist
+    :param projection: Columns requested when the store was written
+    """
+    meta = read_meta(store_path)
+    if meta is None:
+        return False
+    if projection is not None and meta["projection"] != list(projection):
+        return False
+    if not Path(source).exists():
+        return True
+    if meta["source"] is None:
+        return False
+
+    signature = source_signature(source)
+    stored_signature = {k: meta["source"].get(k) for k in signature}
+    if stored_signature == signature:
+        return True
+    if meta["source"]["size"] != signature["size"]:
+        return False
+    if meta["source"].get("hash") != source_hash(source):
+        return False
+
+    # Same content, record the new modification time to skip hashing next time
+    meta["source"].update(signature)
+    meta_path = Path(store_path) / meta_file
+    try:
+        # Replaced at once, attached processes never read a partial file
+        with open(meta_path.with_suffix(".tmp"), "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path.with_suffix(".tmp"), meta_path)
+    except OSError:
+        pass
+    return True
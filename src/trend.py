@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+# Order of the sums kept per group by fit_sums
+sum_columns = ["n", "x", "y", "xx", "yy", "xy", "x_min", "x_max"]
+
+
+def fit_sums(x, y, groups, n_groups):
+    """
+    Sums of x, y and their products per group, rows with a missing value
+    are ignored
+
+    :param x: Values of the explanatory variable
+    :param y: Values of the explained variable
+    :param groups: Integer group of each row, from 0 to n_groups - 1
+    :param n_groups: Number of groups
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    groups = np.asarray(groups)
+    valid = np.isfinite(x) & np.isfinite(y)
+    x, y, groups = x[valid], y[valid], groups[valid]
+
+    sums = np.empty((n_groups, len(sum_columns)))
+    for i, weights in enumerate([None, x, y, x * x, y * y, x * y]):
+        sums[:, i] = np.bincount(groups, weights=weights, minlength=n_groups)
+    sums[:, 6] = np.inf
+    sums[:, 7] = -np.inf
+    np.minimum.at(sums[:, 6], groups, x)
+    np.maximum.at(sums[:, 7], groups, x)
+    return sums
+
+
+def fit_lines(sums, index=None):
+    """
+    Least squares lines y = slope * x + intercept and correlations of each group
+
+    Returns a data frame with n, slope, intercept, r, r2, x_min and x_max per
+    group, slope and r are missing when x (or y for r) is constant.
+
+    :param sums: Sums from fit_sums
+    :param index: Labels of the groups
+    """
+    n, sx, sy, sxx, syy, sxy, x_min, x_max = sums.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Centered sums of squares and products
+        cxx = sxx - sx * sx / n
+        cyy = syy - sy * sy / n
+        cxy = sxy - sx * sy / n
+        cxx[cxx <= 0] = np.nan
+        cyy[cyy <= 0] = np.nan
+        slope = cxy / cxx
+        intercept = (sy - slope * sx) / n
+        r = np.clip(cxy / np.sqrt(cxx * cyy), -1, 1)
+    return pd.DataFrame(
+        {
+            "n": n.astype(int),
+            "slope": slope,
+            "intercept": intercept,
+            "r": r,
+            "r2": r * r,
+            "x_min": x_min,
+            "x_max": x_max,
+        },
+        index=index,
+    )
+
+
+def fit_groups(x, y, groups):
+    """
+    Least squares lines and correlations of y on x for each group at once
+
+    :param x: Values of the explanatory variable
+    :param y: Values of the explained variable
+    :param groups: Group label of each row
+    """
+    codes, labels = pd.factorize(np.asarray(groups), sort=True)
+    return fit_lines(fit_sums(x, y, codes, len(labels)), index=labels)
+
+
+def correlation_matrix(df, method="pearson"):
+    """
+    Pearson or Spearman correlations between all the columns of a data frame
+
+    All pairs are computed at once from sums of products of the columns (matrix
+    products), each pair over the rows where both columns are present. Pairs
+    with a constant column are missing.
+
+    :param df: Data frame of numeric columns
+    :param method: "pearson" or "spearman" (Pearson of the ranks of each column)
+    """
+    if method == "spearman":
+        df = df.rank()
+    values = df.to_numpy(dtype=float)
+    valid = np.isfinite(values)
+    present = valid.astype(float)
+    # Centered on the column means, for the precision of the sums
+    means = np.where(valid, values, 0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    values = np.where(valid, values - means, 0)
+
+    # [i, j]: sums over the rows where columns i and j are present
+    n = present.T @ present
+    sx = values.T @ present
+    sxx = (values * values).T @ present
+    sxy = values.T @ values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cxx = sxx - sx * sx / n
+        cxx[cxx <= 0] = np.nan
+        r = np.clip((sxy - sx * sx.T / n) / np.sqrt(cxx * cxx.T), -1, 1)
+    return pd.DataFrame(r, index=df.columns, columns=df.columns)
+
+
+def strongest_pairs(matrix, n_pairs=25):
+    """
+    Pairs of distinct columns of a correlation matrix, strongest first
+
+    :param matrix: Correlation matrix from correlation_matrix
+    :param n_pairs: Number of pairs to return
+    """
+    rows, columns = np.triu_indices(len(matrix), k=1)
+    pairs = pd.DataFrame(
+        {
+            "X": matrix.columns[columns],
+            "Y": matrix.index[rows],
+            "r": matrix.to_numpy()[rows, columns],
+        }
+    ).dropna()
+    order = np.argsort(-pairs["r"].abs().to_numpy(), kind="stable")
+    return pairs.iloc[order[:n_pairs]].reset_index(drop=True)
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from src.cube import build_cube, cube_totals_masked, cube_totals_since
+
+
+def player_games(n_rows=600, seed=0):
+    """
+    Rows of players in games of two modes, with missing stats
+
+    :param n_rows: Number of rows
+    :param seed: Seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(
+        {
+            "mode": rng.choice(["2v2", "3v3"], n_rows),
+            "player": rng.integers(0, 5, n_rows),
+            "game": rng.permutation(n_rows),
+            "Games": 1,
+            "Goals": rng.integers(0, 4, n_rows).astype(float),
+            "Score": rng.integers(0, 800, n_rows).astype(float),
+        }
+    )
+    frame.loc[rng.random(n_rows) < 0.1, "Goals"] = np.nan
+    return frame
+
+
+def test_totals_since_match_pandas():
+    frame = player_games()
+    cube = build_cube(frame, keys=["mode", "player"], order="game")
+    groups = np.arange(len(cube["groups"]))
+    for since in [0, 150, 599, 600]:
+        totals = cube_totals_since(cube, groups, since)
+        expected = (
+            frame[frame["game"] >= since]
+            .groupby(["mode", "player"])[cube["columns"]]
+            .sum()
+            .reindex(pd.MultiIndex.from_frame(cube["groups"]), fill_value=0)
+        )
+        np.testing.assert_allclose(totals.to_numpy(), expected.to_numpy())
+
+
+def test_totals_masked_match_pandas():
+    frame = player_games()
+    cube = build_cube(frame, keys=["mode", "player"], order="game")
+    groups = np.flatnonzero(cube["groups"]["mode"] == "3v3")
+    selected = np.random.default_rng(1).choice(600, 200, replace=False)
+    totals = cube_totals_masked(cube, groups, np.isin(cube["order"], selected))
+    expected = (
+        frame[frame["game"].isin(selected) & (frame["mode"] == "3v3")]
+        .groupby(["mode", "player"])[cube["columns"]]
+        .sum()
+        .reindex(pd.MultiIndex.from_frame(cube["groups"].iloc[groups]), fill_value=0)
+    )
+    np.testing.assert_allclose(totals.to_numpy(), expected.to_numpy())
+
+
+def test_missing_stat_counts_as_zero():
+    frame = pd.DataFrame(
+        {
+            "mode": "1v1",
+            "player": [0, 0, 0, 1],
+            "game": [0, 1, 2, 3],
+            "Goals": [1.0, np.nan, 2.0, np.nan],
+        }
+    )
+    cube = build_cube(frame, keys=["mode", "player"], order="game")
+    since = cube_totals_since(cube, [0, 1], 0)
+    masked = cube_totals_masked(cube, [0, 1], np.ones(4, dtype=bool))
+    for totals in [since, masked]:
+        assert totals["Goals"].astype(int).tolist() == [3, 0]
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+from src.form import empty_form, extend_form
+
+window, halflife, threshold = 10, 5, 2.5
+
+
+def form_rows(n_rows=2000, seed=0):
+    """
+    Rows of players in two modes, in game order, with missing values and a
+    slump of player 0
+
+    :param n_rows: Number of rows
+    :param seed: Seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(
+        {
+            "mode": rng.choice(["2v2", "3v3"], n_rows),
+            "player": rng.integers(0, 4, n_rows),
+            "order": np.arange(n_rows),
+            "Score": rng.normal(400, 100, n_rows),
+            "Goals": rng.poisson(1, n_rows).astype(float),
+        }
+    )
+    frame.loc[rng.random(n_rows) < 0.05, "Score"] = np.nan
+    slump = (frame["player"] == 0) & frame["order"].between(1000, 1300)
+    frame.loc[slump, "Score"] -= 150
+    return frame
+
+
+def pandas_form(frame, column):
+    """
+    Rolling mean, exponentially weighted mean and streak flag of a column with
+    pandas, per mode and player
+
+    :param frame: Rows from form_rows
+    :param column: Value column
+    """
+    values = frame.groupby(["mode", "player"])[column]
+    rolling = values.transform(lambda s: s.rolling(window, min_periods=1).mean())
+    ewm = values.transform(lambda s: s.ewm(halflife=halflife).mean())
+    mean = values.transform(lambda s: s.expanding().mean())
+    std = values.transform(lambda s: s.expanding().std())
+    count = values.transform(lambda s: s.expanding().count())
+    z = (rolling - mean) / (std / np.sqrt(window))
+    settled = count >= 2 * window
+    flag = np.where(settled & (z > threshold), 1, 0)
+    flag = np.where(settled & (z < -threshold), -1, flag)
+    return pd.DataFrame({"rolling": rolling, "ewm": ewm, "flag": flag})
+
+
+def test_extended_form_match_pandas():
+    frame = form_rows()
+    columns = ["Score", "Goals"]
+    form = empty_form(["mode", "player"], columns, window, halflife, threshold)
+    # Extended in two steps, like a history getting new games
+    form = extend_form(form, frame.iloc[:1500])
+    form = extend_form(form, frame.iloc[1500:])
+
+    rows = pd.Series(np.arange(len(form["order"])), index=form["order"])
+    rows = rows.loc[frame["order"]].to_numpy()
+    for j, column in enumerate(columns):
+        expected = pandas_form(frame, column)
+        np.testing.assert_allclose(
+            form["rolling"][j, rows], expected["rolling"], rtol=1e-5
+        )
+        np.testing.assert_allclose(form["ewm"][j, rows], expected["ewm"], rtol=1e-5)
+        np.testing.assert_array_equal(form["flag"][j, rows], expected["flag"])
+    assert (form["flag"][0] == -1).any()
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+from src.roster import pair_records, roster_index, select_games
+
+players = ["a", "b", "c", "d", "e"]
+
+
+def game_rows(n_games=300, seed=0):
+    """
+    Rows of 2v2 games between the players and untracked ones, and the winner
+    of each game
+
+    :param n_games: Number of games
+    :param seed: Seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    pool = players + ["x", "y", "z"]
+    rows = pd.DataFrame(
+        {
+            "game": np.repeat(np.arange(n_games), 4),
+            "id": np.concatenate(
+                [rng.choice(pool, 4, replace=False) for _ in range(n_games)]
+            ),
+            "team": np.tile(["blue", "blue", "orange", "orange"], n_games),
+        }
+    )
+    winner = rng.choice(["blue", "orange", "draw"], n_games, p=[0.45, 0.45, 0.1])
+    return rows, winner
+
+
+def test_pair_records_match_pandas():
+    rows, winner = game_rows()
+    index = roster_index(rows["game"], rows["id"], rows["team"], players)
+    game_ids = np.arange(50, 300)
+    records = pair_records(index, game_ids, winner)
+
+    tracked = rows[rows["id"].isin(players) & rows["game"].isin(game_ids)]
+    pairs = tracked.merge(tracked, on="game", suffixes=("", "_other"))
+    pairs["won"] = winner[pairs["game"]] == pairs["team"]
+    for relation, same_team in [("together", True), ("against", False)]:
+        related = pairs[(pairs["team"] == pairs["team_other"]) == same_team]
+        counts = related.groupby(["id", "id_other"])["won"].agg(["size", "sum"])
+        counts = counts.reindex(
+            pd.MultiIndex.from_product([players, players]), fill_value=0
+        )
+        n, wins = records[relation]
+        np.testing.assert_array_equal(n.ravel(), counts["size"].to_numpy())
+        np.testing.assert_array_equal(wins.ravel(), counts["sum"].to_numpy())
+
+
+def test_select_games_match_pandas():
+    rows, _ = game_rows()
+    index = roster_index(rows["game"], rows["id"], rows["team"], players)
+    teams = rows.pivot_table(index="game", columns="id", values="team", aggfunc="first")
+    selected = select_games(index, include=["a", "b"], exclude=["c"], teams="opposing")
+    expected = teams[
+        teams["a"].notna()
+        & teams["b"].notna()
+        & teams["c"].isna()
+        & (teams["a"] != teams["b"])
+    ].index
+    np.testing.assert_array_equal(selected, expected)
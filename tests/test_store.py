@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.store import read_store, store_version, write_store
+
+
+def history():
+    """
+    Small history with the kinds of columns of a match history
+    """
+    return pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(
+                ["2025-01-01T10:00", "2025-01-01T10:00", "2025-01-02T12:30"]
+            ),
+            "id": pd.Series(["a", "b", None], dtype="str"),
+            "team": pd.Categorical(["blue", "orange", "blue"]),
+            "core_goals": np.array([1, 0, 3], dtype=np.int16),
+            "core_score": np.array([250.5, np.nan, 610.0], dtype=np.float32),
+        }
+    )
+
+
+def test_read_store_match_written_frame(tmp_path):
+    df = history()
+    write_store(df, tmp_path / "store")
+    stored = read_store(tmp_path / "store", categorical=["team"])
+    # Copied out of the memory-mapped files
+    pd.testing.assert_frame_equal(stored.copy(), df, check_categorical=False)
+    assert list(read_store(tmp_path / "store", ["core_goals", "missing"])) == [
+        "core_goals"
+    ]
+
+
+def test_failed_write_keeps_previous_store(tmp_path):
+    write_store(history(), tmp_path / "store")
+    with pytest.raises(TypeError):
+        # Shards that cannot be saved in the metadata
+        write_store(history().iloc[:1], tmp_path / "store", shards={"a": object()})
+    assert [p.name for p in tmp_path.iterdir()] == ["store"]
+    assert store_version(tmp_path / "store") == 1
+    assert len(read_store(tmp_path / "store")) == 3
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.trend import correlation_matrix, fit_groups
+
+
+def stats(n_rows=500, seed=0):
+    """
+    Correlated stats of three players, with missing values
+
+    :param n_rows: Number of rows
+    :param seed: Seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    shots = rng.poisson(3, n_rows).astype(float)
+    df = pd.DataFrame(
+        {
+            "FixedName": rng.choice(["a", "b", "c"], n_rows),
+            "Shots": shots,
+            "Goals": rng.binomial(shots.astype(int), 0.3).astype(float),
+            "Score": shots * 80 + rng.normal(0, 50, n_rows),
+            "Saves": rng.poisson(2, n_rows).astype(float),
+        }
+    )
+    df.loc[rng.random(n_rows) < 0.05, "Goals"] = np.nan
+    df.loc[rng.random(n_rows) < 0.05, "Score"] = np.nan
+    return df
+
+
+def test_fit_groups_match_polyfit():
+    df = stats()
+    fits = fit_groups(df["Shots"], df["Score"], df["FixedName"])
+    for name, rows in df.dropna(subset=["Shots", "Score"]).groupby("FixedName"):
+        slope, intercept = np.polyfit(rows["Shots"], rows["Score"], 1)
+        assert fits.loc[name, "n"] == len(rows)
+        assert fits.loc[name, "slope"] == pytest.approx(slope)
+        assert fits.loc[name, "intercept"] == pytest.approx(intercept)
+        assert fits.loc[name, "r"] == pytest.approx(rows["Shots"].corr(rows["Score"]))
+
+
+def test_correlation_matrix_match_pandas():
+    df = stats().drop(columns="FixedName")
+    df["Constant"] = 1.0
+    pd.testing.assert_frame_equal(
+        correlation_matrix(df, "pearson"), df.corr("pearson"), check_exact=False
+    )
+
+
+def test_spearman_matrix_match_pandas():
+    # Columns are ranked once, not per pair of columns, so only complete rows
+    # give the same ranks as pandas
+    df = stats().drop(columns="FixedName").dropna()
+    pd.testing.assert_frame_equal(
+        correlation_matrix(df, "spearman"), df.corr("spearman"), check_exact=False
+    )